@@ -1,29 +1,37 @@
-from flask import Flask, request, redirect, url_for, session, render_template, flash, send_file, jsonify
-import os, csv, io, json, zipfile, re
-import whisper
-from transformers import pipeline
-import imageio_ffmpeg
-from db_utils import get_connection, insert_interaction, get_sales_rep_id, get_product_id, match_clinic, \
-    fuzzy_match_clinic
+from flask import Flask, request, redirect, url_for, session, render_template, flash, send_file, jsonify, \
+    Response, stream_with_context, g
+from werkzeug.utils import secure_filename
+import os, csv, io, json, time, zipfile
+from db_utils import borrow_connection, insert_interactions_bulk, insert_clinics_bulk, match_clinic, \
+    fuzzy_match_clinic, id_allocator, stream_interactions
+from clinic_index import clinic_index
+from models import SPEECH_SETTINGS, NER_SETTINGS, run_ner
+from reference_cache import reference_cache
+from batch_store import new_batch_id, append_records, load_records, clear_batch
+from extraction_rules import scan_note, scan_notes, strip_clinic_prefix, rules_fingerprint
+from exports import stream_csv, stream_zip
+from jobs import create_job, start_job, set_file_status, get_job, wait_for_change, map_files
+from audio import AUDIO_SETTINGS
+from transcription import transcribe_file, LONG_AUDIO_THRESHOLD_SECONDS, LONG_AUDIO_CHUNK_SECONDS
+from transcription_cache import cache_key, get_cached, put_cached, cache_stats
+from metrics import observe, timed, start_request, finish_request, render as render_metrics
 from datetime import datetime
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 ALLOWED_EXTENSIONS = {'wav', 'mp3', 'm4a'}
+# Browsers reuse the product and rep lists this long, then revalidate them with If-None-Match.
+REFERENCE_LIST_MAX_AGE = int(os.environ.get('REFERENCE_LIST_MAX_AGE', 60))
 
-# --- FFMPEG and Model Initialization ---
-ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
-os.environ['PATH'] += os.pathsep + os.path.dirname(ffmpeg_path)
+# --- Model Settings ---
+NER_BATCH_SIZE = int(os.environ.get('NER_BATCH_SIZE', 8))
+# Everything that changes transcription or extraction output must be part of the cache key.
+CACHE_SETTINGS = {"speech": SPEECH_SETTINGS, "transcribe_options": {}, "ner": NER_SETTINGS, "audio": AUDIO_SETTINGS,
+                  "long_audio": [LONG_AUDIO_THRESHOLD_SECONDS, LONG_AUDIO_CHUNK_SECONDS]}
 
-print("Loading Whisper model...")
-whisper_model = whisper.load_model("base")
-print("Loading NER model...")
-ner_model = pipeline("ner", model="dslim/bert-base-NER", grouped_entities=True)
-print("Models loaded successfully.")
-
-# --- Unchanged Functions ---
+# --- Field Extraction ---
 product_keywords = [
     "canine vaccines", "dental cleaning kits", "deworming tablets",
     "diagnostic equipment", "feline vaccines", "flea & tick prevention kits",
@@ -35,18 +43,12 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def extract_clinic_name_from_text(note):
-    negation_keywords = ["wait", "no", "not", "isn't", "wasn't", "aren't", "don't", "didn't", "not from", "it's not"]
-    ner_results = ner_model(note)
+def extract_clinic_name_from_text(note, ner_results=None, scan=None):
+    if ner_results is None: ner_results = run_ner(note)
+    if scan is None: scan = scan_note(note)
     org_entities = [{"word": ent["word"], "start": ent.get("start", -1)} for ent in ner_results if
                     ent["entity_group"] == "ORG"]
-    note_lower = note.lower()
-    neg_index = -1
-    for word in negation_keywords:
-        idx = note_lower.find(word)
-        if idx != -1:
-            neg_index = idx
-            break
+    neg_index = scan["clinic_negation_index"]
     if org_entities:
         if neg_index != -1:
             candidates_after_neg = [ent["word"] for ent in org_entities if ent["start"] > neg_index]
@@ -55,37 +57,12 @@ def extract_clinic_name_from_text(note):
     return ""
 
 
-def extract_samples_and_followup(note):
-    follow_up_keywords = ["follow up", "follow-up", "reconnect", "call again", "get back", "schedule another",
-                          "next visit"]
-    samples_keywords = ["sample", "samples", "provided", "left some", "leave", "delivered", "they received", "they got",
-                        "drop off", "give them"]
-    negation_pattern = re.compile(
-        r"\b(no|not|didn’t|didn't|never|without|forgot|ran out|didn’t end up|was going to but didn’t|meant to but didn’t)\b",
-        re.IGNORECASE)
-    samples_given, follow_up = "Unknown", "Unknown"
-    sentences = list(reversed(re.split(r'[.!?\n]', note)))
-    for sentence in sentences:
-        sentence = sentence.strip().lower()
-        if not sentence: continue
-        if any(kw in sentence for kw in samples_keywords):
-            if negation_pattern.search(sentence):
-                samples_given = "No"
-            else:
-                samples_given = "Yes"
-            break
-    for sentence in sentences:
-        sentence = sentence.strip().lower()
-        if not sentence: continue
-        if any(kw in sentence for kw in follow_up_keywords):
-            if negation_pattern.search(sentence):
-                follow_up = "No"
-            else:
-                follow_up = "Yes"
-            break
-    return samples_given.title(), follow_up.title()
+def extract_samples_and_followup(note, scan=None):
+    if scan is None: scan = scan_note(note)
+    return scan["Samples_Given"], scan["Follow_Up"]
 
 
+@timed("crm_match_seconds", function="match_product_from_note")
 def match_product_from_note(note, product_keywords, threshold=70):
     note_lower = note.lower()
     best_match, best_score = None, 0
@@ -96,161 +73,294 @@ def match_product_from_note(note, product_keywords, threshold=70):
     return best_match
 
 
+def loaded_reference_cache():
+    if reference_cache.is_stale():
+        with borrow_connection() as connection:
+            reference_cache.ensure_loaded(connection)
+    return reference_cache
+
+
+@timed("crm_match_seconds", function="match_sales_rep")
 def match_sales_rep(rep_name_candidate):
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT DISTINCT Rep_Name FROM sales_rep")
-            reps = [row['Rep_Name'] for row in cursor.fetchall()]
-        best_match, best_score = None, 0
-        for rep in reps:
-            score = fuzz.ratio(rep.lower(), rep_name_candidate.lower())
-            if score > best_score and score >= 45:
-                best_score, best_match = score, rep
-        return best_match
-    finally:
-        connection.close()
+    match = process.extractOne(rep_name_candidate, loaded_reference_cache().rep_names(), scorer=fuzz.ratio,
+                               processor=str.lower, score_cutoff=45)
+    return match[0] if match else None
 
 
-def extract_fields(note):
-    ner_results = ner_model(note)
+@timed("crm_stage_seconds", stage="extract_fields")
+def extract_fields(note, ner_results=None, scan=None):
+    # Callers that already ran NER and the keyword rules (extract_fields_batch) pass the results in.
+    if ner_results is None: ner_results = run_ner(note)
+    if scan is None: scan = scan_note(note)
     rep_name, contact_name, clinic_name, product_interest = "", "", "", ""
     per_entities = [ent['word'] for ent in ner_results if ent['entity_group'] == 'PER']
     if per_entities:
         rep_name = per_entities[0]
         if len(per_entities) > 1: contact_name = per_entities[1]
     product_interest = match_product_from_note(note, product_keywords)
-    clinic_name = extract_clinic_name_from_text(note)
-    samples_given, follow_up = extract_samples_and_followup(note)
+    clinic_name = extract_clinic_name_from_text(note, ner_results, scan)
+    samples_given, follow_up = extract_samples_and_followup(note, scan)
     matched_rep = match_sales_rep(rep_name)
     if matched_rep: rep_name = matched_rep
-    status = "Unknown"
-    status_keywords = {"closed - converted": ["closed and converted", "successfully closed"],
-                       "closed - not converted": ["closed but not converted", "not converted"],
-                       "working": ["still working", "currently working", "in progress"],
-                       "new": ["new lead", "first time"]}
-    for label, keywords in status_keywords.items():
-        if status != "Unknown": break
-        for phrase in keywords:
-            if phrase in note.lower():
-                status = label
-                break
-    lead_source = "Unknown"
-    lead_source_keywords = {"web form": "Web Form", "referral": "Referral", "phone": "Phone Inquiry",
-                            "call": "Phone Inquiry", "trade show": "Trade Show", "email": "Email Campaign"}
-    for keyword, label in lead_source_keywords.items():
-        if keyword in note.lower():
-            lead_source = label
-            break
     return {"Rep_Name": rep_name, "Contact_Name": contact_name, "Clinic_Name": clinic_name,
             "Product_Interest": product_interest, "Samples_Given": samples_given, "Follow_Up": follow_up,
-            "Status": status.title(), "Lead_Source": lead_source}
+            "Status": scan["Status"], "Lead_Source": scan["Lead_Source"]}
+
+
+def extract_fields_batch(notes):
+    if not notes: return []
+    ner_batch = run_ner(list(notes), batch_size=NER_BATCH_SIZE)
+    return [extract_fields(note, ner_results, scan)
+            for note, ner_results, scan in zip(notes, ner_batch, scan_notes(notes))]
 
 
 def clean_clinic_name(name):
-    prefixes = ['out of', 'at', 'from', 'to', 'of', 'in', 'inside', 'near', 'beside']
-    name = name.strip().lower()
-    for prefix in prefixes:
-        if name.startswith(prefix + " "):
-            name = name[len(prefix) + 1:]
-            break
-    return name.strip().title()
+    return strip_clinic_prefix(name).strip().title()
+
+
+@timed("crm_stage_seconds", stage="match")
+def match_upload(extracted):
+    cleaned_name = clean_clinic_name(extracted.get("Clinic_Name", ""))
+    extracted["Clinic_Name"] = cleaned_name
+    with borrow_connection() as connection:
+        clinic_info = match_clinic(cleaned_name, connection)
+        if clinic_info:
+            extracted.update({"clinic_id": clinic_info["Clinic_ID"], "match_type": "exact"})
+        else:
+            fuzzy_result = fuzzy_match_clinic(cleaned_name, connection)
+            if fuzzy_result:
+                extracted.update({"clinic_id": fuzzy_result["Clinic_ID"],
+                                  "clinic_name_matched": fuzzy_result["Clinic_Name"],
+                                  "match_score": fuzzy_result["match_score"], "match_type": "fuzzy"})
+            else:
+                extracted["match_type"] = "new"
+    return extracted
+
+
+def process_upload_file(job_id, index, filepath, filename):
+    set_file_status(job_id, index, "transcribing")
+    try:
+        key = cache_key(filepath, dict(CACHE_SETTINGS, rules=rules_fingerprint()))
+        cached = get_cached(key)
+        if cached:
+            transcription, extracted = cached["transcription"], dict(cached["fields"])
+        else:
+            transcription = transcribe_file(filepath)["text"]
+            set_file_status(job_id, index, "extracting")
+            extracted = extract_fields(transcription)
+            put_cached(key, transcription, extracted)
+            extracted = dict(extracted)
+        set_file_status(job_id, index, "matching")
+        extracted["filename"] = filename
+        extracted["transcription"] = transcription
+        set_file_status(job_id, index, "done", result=match_upload(extracted))
+    except Exception as e:
+        print(f"Processing failed for {filename}: {e}")
+        set_file_status(job_id, index, "failed", error=str(e))
+    finally:
+        discard_upload(filepath)
+
+
+def process_upload_job(job_id, items):
+    # Files are transcribed in parallel (up to JOB_FILE_CONCURRENCY per upload) and each one is published as
+    # soon as it is matched so the review page can stream it in; results keep their upload position.
+    map_files(items, lambda index, item: process_upload_file(job_id, index, *item))
+
+
+def discard_upload(filepath):
+    # Uploads are only needed until they are transcribed; the job folder goes with its last file.
+    try:
+        os.remove(filepath)
+        os.rmdir(os.path.dirname(filepath))
+    except OSError:
+        pass
+
+
+def submission_batch_id():
+    # Submitted records live in batch_store; the session cookie only carries the batch ID.
+    if "submission_batch_id" not in session:
+        session["submission_batch_id"] = new_batch_id()
+    return session["submission_batch_id"]
 
 
 # --- Flask Routes ---
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    start_request()
+
+
+@app.after_request
+def record_request_timing(response):
+    # Streamed bodies (exports, job events) are timed until their headers are sent.
+    elapsed = time.perf_counter() - g.request_started
+    server_timing = finish_request(elapsed)
+    observe("crm_http_request_seconds", elapsed, endpoint=request.endpoint or "unmatched", method=request.method,
+            status=response.status_code)
+    if server_timing: response.headers["Server-Timing"] = server_timing
+    return response
+
+
+@app.route("/metrics")
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route('/', methods=['GET', 'POST'])
 def upload_file():
     if request.method == 'POST':
-        files = request.files.getlist('files')
-        if not files or files[0].filename == '':
+        files = [file for file in request.files.getlist('files') if file and allowed_file(file.filename)]
+        if not files:
             flash('No selected file')
             return redirect(request.url)
-        old_clients, new_clients = [], []
-        for file in files:
-            if file and allowed_file(file.filename):
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-                file.save(filepath)
-                result = whisper_model.transcribe(filepath)
-                transcription = result["text"]
-                extracted = extract_fields(transcription)
-                extracted["filename"] = file.filename
-                extracted["transcription"] = transcription
-                cleaned_name = clean_clinic_name(extracted.get("Clinic_Name", ""))
-                extracted["Clinic_Name"] = cleaned_name
-                with get_connection() as connection:
-                    clinic_info = match_clinic(cleaned_name, connection)
-                    if clinic_info:
-                        extracted.update({"clinic_id": clinic_info["Clinic_ID"], "match_type": "exact"})
-                        old_clients.append(extracted)
-                    else:
-                        fuzzy_result = fuzzy_match_clinic(cleaned_name, connection)
-                        if fuzzy_result:
-                            extracted.update({"clinic_id": fuzzy_result["Clinic_ID"],
-                                              "clinic_name_matched": fuzzy_result["Clinic_Name"],
-                                              "match_score": fuzzy_result["match_score"], "match_type": "fuzzy"})
-                            old_clients.append(extracted)
-                        else:
-                            extracted["match_type"] = "new"
-                            new_clients.append(extracted)
-        return render_template("review.html", old_clients=old_clients, new_clients=new_clients)
+        job_id = create_job([file.filename for file in files])
+        job_folder = os.path.join(app.config['UPLOAD_FOLDER'], job_id)
+        os.makedirs(job_folder, exist_ok=True)
+        items = []
+        for index, file in enumerate(files):
+            # Stored under a sanitized, position-prefixed name so files sharing a name (e.g. several phone
+            # recordings called "New Recording.m4a") don't overwrite each other; the original is shown.
+            filepath = os.path.join(job_folder, f"{index}_{secure_filename(file.filename)}")
+            file.save(filepath)
+            items.append((filepath, file.filename))
+        start_job(job_id, items, process_upload_job)
+        return jsonify({"job_id": job_id, "status_url": url_for("job_status", job_id=job_id),
+                        "review_url": url_for("job_review", job_id=job_id),
+                        "live_url": url_for("job_live_review", job_id=job_id)}), 202
     return render_template("index.html")
 
 
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None: return jsonify({"error": "Unknown job"}), 404
+    job.pop("results")
+    return jsonify(job)
+
+
+@app.route("/jobs/<job_id>/review")
+def job_review(job_id):
+    job = get_job(job_id)
+    if job is None: return "Unknown or expired job.", 404
+    if job["status"] in ("queued", "running"):
+        job.pop("results")
+        return jsonify(job), 202
+    results = [r for r in job["results"] if r]
+    old_clients = [r for r in results if r["match_type"] != "new"]
+    new_clients = [r for r in results if r["match_type"] == "new"]
+    return render_template("review.html", old_clients=old_clients, new_clients=new_clients)
+
+
+@app.route("/jobs/<job_id>/live")
+def job_live_review(job_id):
+    if get_job(job_id) is None: return "Unknown or expired job.", 404
+    return render_template("review.html", old_clients=[], new_clients=[],
+                           events_url=url_for("job_events", job_id=job_id))
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    if get_job(job_id) is None: return jsonify({"error": "Unknown job"}), 404
+
+    def stream():
+        sent, version = set(), None
+        while True:
+            job = wait_for_change(job_id, version, timeout=15)
+            if job is None:
+                yield sse_event("error", {"error": "This upload job has expired."})
+                return
+            if job["version"] == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = job["version"]
+            for index, (file, result) in enumerate(zip(job["files"], job["results"])):
+                if index in sent or file["status"] not in ("done", "failed"): continue
+                sent.add(index)
+                payload = {"index": index, "filename": file["filename"], "status": file["status"],
+                           "error": file["error"]}
+                if result and result["match_type"] == "new":
+                    payload["record"] = result
+                elif result:
+                    # The browser numbers form fields itself, replacing the __INDEX__ placeholder.
+                    payload["html"] = render_template("_review_record.html", record=result, index="__INDEX__")
+                yield sse_event("result", payload)
+            yield sse_event("progress", {"completed": job["completed"], "total": job["total"]})
+            if job["status"] not in ("queued", "running"):
+                yield sse_event("done", {"status": job["status"], "total": job["total"]})
+                return
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.route('/submit_existing', methods=['POST'])
 def submit_existing():
     count = int(request.form.get("count", 0))
     new_clients_from_upload = json.loads(request.form.get("new_clients_json", "[]"))
 
-    existing_interactions, confirmed_new_clients = [], []
-    processed_keys = set()
-
-    with get_connection() as connection:
-        for i in range(count):
-            decision = request.form.get(f"clinic_decision_{i}", "existing")
-
-            record_data = {
-                "clinic_id": request.form.get(f"clinic_id_{i}"),
-                "Clinic_Name": request.form.get(f"clinic_name_{i}", "").strip(),
-                "Contact_Name": request.form.get(f"contact_name_{i}", "").strip(),
-                "Rep_Name": request.form.get(f"rep_name_{i}", "").strip(),
-                "Product_Interest": request.form.get(f"product_interest_{i}", "").strip(),
-                "Samples_Given": request.form.get(f"samples_given_{i}", "").strip(),
-                "Follow_Up": request.form.get(f"follow_up_{i}", "").strip(),
-                "Status": request.form.get(f"status_{i}", "").strip(),
-                "Lead_Source": request.form.get(f"lead_source_{i}", "").strip(),
-                "Last_Contacted": request.form.get(f"last_contacted_{i}", "").strip(),
-                "Additional_Notes": request.form.get(f"additional_notes_{i}", "").strip(),
-                "transcription": request.form.get(f"transcription_{i}", "").strip(),
-                "filename": request.form.get(f"filename_{i}", "").strip()
-            }
-
-            if decision == "new":
-                confirmed_new_clients.append(record_data)
-                continue
+    existing_records, confirmed_new_clients = [], []
+
+    for i in range(count):
+        decision = request.form.get(f"clinic_decision_{i}", "existing")
+
+        record_data = {
+            "clinic_id": request.form.get(f"clinic_id_{i}"),
+            "Clinic_Name": request.form.get(f"clinic_name_{i}", "").strip(),
+            "Contact_Name": request.form.get(f"contact_name_{i}", "").strip(),
+            "Rep_Name": request.form.get(f"rep_name_{i}", "").strip(),
+            "Product_Interest": request.form.get(f"product_interest_{i}", "").strip(),
+            "Samples_Given": request.form.get(f"samples_given_{i}", "").strip(),
+            "Follow_Up": request.form.get(f"follow_up_{i}", "").strip(),
+            "Status": request.form.get(f"status_{i}", "").strip(),
+            "Lead_Source": request.form.get(f"lead_source_{i}", "").strip(),
+            "Last_Contacted": request.form.get(f"last_contacted_{i}", "").strip(),
+            "Additional_Notes": request.form.get(f"additional_notes_{i}", "").strip(),
+            "transcription": request.form.get(f"transcription_{i}", "").strip(),
+            "filename": request.form.get(f"filename_{i}", "").strip()
+        }
+
+        if decision == "new":
+            confirmed_new_clients.append(record_data)
+            continue
+        existing_records.append(record_data)
+
+    existing_interactions, failed = [], []
+    with borrow_connection() as connection:
+        # Records without a clinic ID are resolved by name in one query for the whole form.
+        unresolved = sorted({r["Clinic_Name"].lower() for r in existing_records if not r["clinic_id"]})
+        clinic_ids_by_name = {}
+        if unresolved:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT Clinic_ID, LOWER(TRIM(Clinic_Name)) AS name FROM clinic WHERE LOWER(TRIM(Clinic_Name)) IN ({', '.join(['%s'] * len(unresolved))})",
+                    unresolved)
+                for row in cursor.fetchall(): clinic_ids_by_name.setdefault(row["name"], row["Clinic_ID"])
 
-            clinic_id = record_data["clinic_id"]
-            if not clinic_id:
-                with connection.cursor() as cursor:
-                    cursor.execute("SELECT Clinic_ID FROM clinic WHERE LOWER(TRIM(Clinic_Name)) = LOWER(TRIM(%s))",
-                                   (record_data["Clinic_Name"],))
-                    row = cursor.fetchone()
-                    clinic_id = row["Clinic_ID"] if row else None
+        to_insert = []
+        for record_data in existing_records:
+            clinic_id = record_data["clinic_id"] or clinic_ids_by_name.get(record_data["Clinic_Name"].lower())
             if not clinic_id: continue
+            # Repeated records (same clinic, rep, product and day) are left to the database's unique key.
+            to_insert.append((clinic_id, record_data))
 
-            interaction_key = (clinic_id, record_data["Product_Interest"].lower(), record_data["Rep_Name"].lower())
-            if interaction_key in processed_keys: continue
-
-            interaction_date, crm_created_date = insert_interaction(clinic_id, record_data, connection)
-            processed_keys.add(interaction_key)
-
+        results = insert_interactions_bulk(to_insert, connection)
+        for (clinic_id, record_data), result in zip(to_insert, results):
+            if result["status"] == "failed":
+                failed.append(f"{record_data['filename'] or record_data['Clinic_Name']}: {result['error']}")
+                continue
+            if result["duplicate_of"] is not None: continue  # repeated within this form; listed once
             existing_interactions.append({
                 "Clinic_ID": clinic_id, "Contact_Name": record_data["Contact_Name"],
                 "Rep_Name": record_data["Rep_Name"],
                 "Product_Interest": record_data["Product_Interest"], "Samples_Given": record_data["Samples_Given"],
                 "Follow_Up": record_data["Follow_Up"], "Status": record_data["Status"],
-                "Interaction_Date": interaction_date,
+                "Interaction_Date": result["interaction_date"],
                 "Lead_Source": record_data["Lead_Source"], "Last_Contacted": record_data["Last_Contacted"],
-                "Additional_Notes": record_data["Additional_Notes"], "CRM_Created_Date": crm_created_date,
+                "Additional_Notes": record_data["Additional_Notes"], "CRM_Created_Date": result["crm_created_date"],
                 "Transcription": record_data["transcription"], "Filename": record_data["filename"]
             })
         connection.commit()
@@ -266,88 +376,98 @@ def submit_existing():
         elif not client.get('filename'):
              unique_new_clients.append(client)
 
-    session["submitted_interactions"] = session.get("submitted_interactions", []) + existing_interactions
+    append_records(submission_batch_id(), existing_interactions)
+    if failed: flash(f"{len(failed)} interaction(s) could not be saved: " + "; ".join(failed))
     flash("Existing clinic interactions processed successfully.")
     return render_template("bulk_new_clinic_form.html", new_clients=unique_new_clients)
 
 
-# --- Other routes are unchanged ---
 @app.route("/submit_new_clinics", methods=["POST"])
 def submit_new_clinics():
     count = int(request.form.get("count", 0))
-    new_interaction_records = []
-    with get_connection() as connection:
-        for i in range(count):
-            clinic_name = request.form.get(f"clinic_name_{i}")
-            clinic_type = request.form.get(f"clinic_type_{i}")
-            industry = request.form.get(f"industry_{i}")
-            address = request.form.get(f"address_{i}")
-            region = request.form.get(f"region_{i}")
-            parent_company = request.form.get(f"parent_company_{i}")
-            contact_name = request.form.get(f"contact_name_{i}")
-            rep_name = request.form.get(f"rep_name_{i}")
-            product_name = request.form.get(f"product_interest_{i}")
-            interaction_date = request.form.get(f"interaction_date_{i}") or datetime.now().strftime("%Y-%m-%d")
-            follow_up = request.form.get(f"follow_up_{i}")
-            samples_given = request.form.get(f"samples_given_{i}")
-            status = request.form.get(f"status_{i}")
-            lead_source = request.form.get(f"lead_source_{i}")
-            last_contacted = request.form.get(f"last_contacted_{i}") or interaction_date
-            additional_notes = request.form.get(f"additional_notes_{i}")
-            transcription = request.form.get(f"transcription_{i}", "")
-            filename = request.form.get(f"filename_{i}", "")
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT MAX(Clinic_ID) AS max_id FROM clinic WHERE Clinic_ID REGEXP '^C[0-9]+$'")
-                row = cursor.fetchone()
-                new_id_num = int(row["max_id"][1:]) + 1 if row and row["max_id"] else 1
-                clinic_id = f"C{str(new_id_num).zfill(3)}"
-                cursor.execute(
-                    "INSERT INTO clinic (Clinic_ID, Clinic_Name, Clinic_Type, Industry, Clinic_Address, Region, Parent_Company, Contact_Name) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
-                    (clinic_id, clinic_name, clinic_type, industry, address, region, parent_company, contact_name))
-                sales_rep_id = get_sales_rep_id(rep_name, connection)
-                product_id = get_product_id(product_name, connection)
-                crm_created_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                cursor.execute(
-                    "INSERT INTO crm_interaction (Clinic_ID, Contact_Name, Sales_Rep_ID, Product_ID, Interaction_Date, Follow_Up, Samples_Given, Status, Lead_Source, Last_Contacted, Additional_Notes, CRM_Created_Date) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
-                    (clinic_id, contact_name, sales_rep_id, product_id, interaction_date, follow_up, samples_given,
-                     status, lead_source, last_contacted, additional_notes, crm_created_date))
-                new_interaction_records.append(
-                    {"Clinic_ID": clinic_id, "Contact_Name": contact_name, "Rep_Name": rep_name,
-                     "Product_Interest": product_name, "Interaction_Date": interaction_date, "Follow_Up": follow_up,
-                     "Samples_Given": samples_given, "Status": status, "Lead_Source": lead_source,
-                     "Last_Contacted": last_contacted, "Additional_Notes": additional_notes,
-                     "CRM_Created_Date": crm_created_date, "Transcription": transcription, "Filename": filename})
+    clinics, interactions, extras = [], [], []
+    for i in range(count):
+        interaction_date = request.form.get(f"interaction_date_{i}") or datetime.now().strftime("%Y-%m-%d")
+        clinics.append({
+            "Clinic_Name": request.form.get(f"clinic_name_{i}"), "Clinic_Type": request.form.get(f"clinic_type_{i}"),
+            "Industry": request.form.get(f"industry_{i}"), "Clinic_Address": request.form.get(f"address_{i}"),
+            "Region": request.form.get(f"region_{i}"), "Parent_Company": request.form.get(f"parent_company_{i}"),
+            "Contact_Name": request.form.get(f"contact_name_{i}")})
+        interactions.append({
+            "Contact_Name": request.form.get(f"contact_name_{i}"), "Rep_Name": request.form.get(f"rep_name_{i}"),
+            "Product_Interest": request.form.get(f"product_interest_{i}"), "Interaction_Date": interaction_date,
+            "Follow_Up": request.form.get(f"follow_up_{i}"), "Samples_Given": request.form.get(f"samples_given_{i}"),
+            "Status": request.form.get(f"status_{i}"), "Lead_Source": request.form.get(f"lead_source_{i}"),
+            "Last_Contacted": request.form.get(f"last_contacted_{i}") or interaction_date,
+            "Additional_Notes": request.form.get(f"additional_notes_{i}")})
+        extras.append({"Transcription": request.form.get(f"transcription_{i}", ""),
+                       "Filename": request.form.get(f"filename_{i}", "")})
+
+    new_interaction_records, failed = [], []
+    with borrow_connection() as connection:
+        for clinic, clinic_id in zip(clinics, id_allocator.allocate("clinic", len(clinics))):
+            clinic["Clinic_ID"] = clinic_id
+        insert_clinics_bulk(clinics, connection)
+        results = insert_interactions_bulk([(clinic["Clinic_ID"], interaction)
+                                            for clinic, interaction in zip(clinics, interactions)],
+                                           connection, require_product=False)
+        for clinic, interaction, extra, result in zip(clinics, interactions, extras, results):
+            if result["status"] == "failed":
+                failed.append(f"{clinic['Clinic_Name']}: {result['error']}")
+                continue
+            new_interaction_records.append(
+                {"Clinic_ID": clinic["Clinic_ID"], "Contact_Name": interaction["Contact_Name"],
+                 "Rep_Name": interaction["Rep_Name"], "Product_Interest": interaction["Product_Interest"],
+                 "Interaction_Date": interaction["Interaction_Date"], "Follow_Up": interaction["Follow_Up"],
+                 "Samples_Given": interaction["Samples_Given"], "Status": interaction["Status"],
+                 "Lead_Source": interaction["Lead_Source"], "Last_Contacted": interaction["Last_Contacted"],
+                 "Additional_Notes": interaction["Additional_Notes"], "CRM_Created_Date": result["crm_created_date"],
+                 **extra})
         connection.commit()
-    session["submitted_interactions"] = session.get("submitted_interactions", []) + new_interaction_records
+    # A failed bulk write rolls back the whole transaction, including the clinic rows.
+    if not failed:
+        for clinic in clinics:
+            clinic_index.add(clinic["Clinic_ID"], clinic["Clinic_Name"])
+    else:
+        flash(f"{len(failed)} new clinic record(s) could not be saved: " + "; ".join(failed))
+    append_records(submission_batch_id(), new_interaction_records)
     return redirect(url_for("submission_success"))
 
 
+def reference_list_response(items):
+    """
+    JSON response with an ETag, answered with 304 when the browser's copy is still current.
+    """
+    response = jsonify(items)
+    response.add_etag()
+    response.cache_control.private = True
+    response.cache_control.max_age = REFERENCE_LIST_MAX_AGE
+    return response.make_conditional(request)
+
+
 @app.route("/get_product_list")
 def get_product_list():
-    with get_connection() as connection:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT DISTINCT Product_Name FROM product")
-            return jsonify([row["Product_Name"] for row in cursor.fetchall()])
+    return reference_list_response(loaded_reference_cache().product_names())
 
 
 @app.route("/get_clinic_list")
 def get_clinic_list():
-    keyword = request.args.get("q", "").strip().lower()
+    keyword = request.args.get("q", "").strip()
     if not keyword: return jsonify([])
-    with get_connection() as connection:
-        with connection.cursor() as cursor:
-            query = "SELECT Clinic_ID, Clinic_Name FROM clinic WHERE LOWER(Clinic_Name) LIKE %s LIMIT 10"
-            cursor.execute(query, (f"%{keyword}%",))
-            return jsonify(
-                [{"Clinic_ID": row["Clinic_ID"], "Clinic_Name": row["Clinic_Name"]} for row in cursor.fetchall()])
+    if clinic_index.is_stale():
+        with borrow_connection() as connection:
+            clinic_index.ensure_loaded(connection)
+    return jsonify(clinic_index.search(keyword, limit=10))
 
 
 @app.route("/get_rep_list")
 def get_rep_list():
-    with get_connection() as connection:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT DISTINCT Rep_Name FROM sales_rep ORDER BY Rep_Name ASC")
-            return jsonify([row["Rep_Name"] for row in cursor.fetchall() if row.get("Rep_Name")])
+    return reference_list_response(sorted(loaded_reference_cache().rep_names(), key=str.lower))
+
+
+@app.route("/cache_stats")
+def get_cache_stats():
+    return jsonify(cache_stats())
 
 
 @app.route("/submission_success")
@@ -357,7 +477,8 @@ def submission_success():
 
 @app.route("/download_csvs")
 def download_csvs():
-    interactions = session.get("submitted_interactions", [])
+    batch_id = session.get("submission_batch_id")
+    interactions = load_records(batch_id)
     if not interactions: return "No CRM interaction data available.", 400
     memory_file = io.BytesIO()
     with zipfile.ZipFile(memory_file, "w", zipfile.ZIP_DEFLATED) as zipf:
@@ -369,11 +490,41 @@ def download_csvs():
         writer.writeheader()
         writer.writerows(interactions)
         zipf.writestr("crm_interaction.csv", crm_buffer.getvalue())
-    session.pop("submitted_interactions", None)
+    clear_batch(batch_id)
+    session.pop("submission_batch_id", None)
     memory_file.seek(0)
     return send_file(memory_file, mimetype='application/zip', as_attachment=True, download_name="crm_interactions.zip")
 
 
+EXPORT_FIELDNAMES = ["Clinic_ID", "Clinic_Name", "Region", "Contact_Name", "Rep_Name", "Product_Interest",
+                     "Samples_Given", "Follow_Up", "Status", "Interaction_Date", "Lead_Source", "Last_Contacted",
+                     "Additional_Notes", "CRM_Created_Date"]
+
+
+@app.route("/export_interactions")
+def export_interactions():
+    filters = {"start_date": request.args.get("start_date", "").strip(),
+               "end_date": request.args.get("end_date", "").strip(),
+               "rep_name": request.args.get("rep", "").strip(), "region": request.args.get("region", "").strip(),
+               "status": request.args.get("status", "").strip()}
+    for key in ("start_date", "end_date"):
+        if filters[key]:
+            try:
+                datetime.strptime(filters[key], "%Y-%m-%d")
+            except ValueError:
+                return f"{key} must be a YYYY-MM-DD date.", 400
+    export_format = request.args.get("format", "zip")
+    if export_format not in ("zip", "csv"): return "format must be zip or csv.", 400
+    rows = stream_interactions(**filters)
+    period = "_".join(filter(None, [filters["start_date"], filters["end_date"]])) or "all"
+    if export_format == "csv":
+        body, mimetype = stream_csv(rows, EXPORT_FIELDNAMES), "text/csv"
+    else:
+        body, mimetype = stream_zip(rows, EXPORT_FIELDNAMES, "crm_interaction.csv"), "application/zip"
+    return Response(body, mimetype=mimetype, headers={
+        "Content-Disposition": f"attachment; filename=crm_interactions_{period}.{export_format}"})
+
+
 # if __name__ == '__main__':
 #     if not os.path.exists(app.config['UPLOAD_FOLDER']):
 #         os.makedirs(app.config['UPLOAD_FOLDER'])
@@ -0,0 +1,120 @@
+import bisect
+import os
+import re
+import subprocess
+
+import imageio_ffmpeg
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+# Preprocessing: silences quieter than AUDIO_SILENCE_DB lasting at least AUDIO_TRIM_MIN_SILENCE seconds are
+# cut out before transcription (leading and trailing ones entirely, internal ones down to twice AUDIO_TRIM_PADDING).
+AUDIO_TRIM_SILENCE = os.environ.get('AUDIO_TRIM_SILENCE', '1') == '1'
+AUDIO_SILENCE_DB = float(os.environ.get('AUDIO_SILENCE_DB', -35))
+AUDIO_TRIM_MIN_SILENCE = float(os.environ.get('AUDIO_TRIM_MIN_SILENCE', 1.0))
+AUDIO_TRIM_PADDING = float(os.environ.get('AUDIO_TRIM_PADDING', 0.25))
+# Everything here changes what the model hears, so it is part of the transcription cache key.
+AUDIO_SETTINGS = {"trim_silence": AUDIO_TRIM_SILENCE, "silence_db": AUDIO_SILENCE_DB,
+                  "trim_min_silence": AUDIO_TRIM_MIN_SILENCE, "trim_padding": AUDIO_TRIM_PADDING}
+
+_SILENCE_START = re.compile(r"silence_start: (-?[0-9.]+)")
+_SILENCE_END = re.compile(r"silence_end: (-?[0-9.]+)")
+
+
+def decode_audio(filepath, detect_silence=False, noise_db=-35, min_silence=0.5):
+    """
+    Decodes any audio file to 16 kHz mono float32 samples with the bundled ffmpeg, the same
+    conversion Whisper performs internally. With detect_silence, the same ffmpeg run also reports
+    silent stretches quieter than noise_db lasting at least min_silence seconds.
+    Returns (samples, silences) where silences is a list of (start, end) times in seconds.
+    """
+    cmd = [imageio_ffmpeg.get_ffmpeg_exe(), "-nostdin", "-threads", "0", "-i", filepath]
+    if detect_silence:
+        cmd += ["-af", f"silencedetect=noise={noise_db}dB:d={min_silence}"]
+    cmd += ["-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-"]
+    try:
+        process = subprocess.run(cmd, capture_output=True, check=True)
+    except subprocess.CalledProcessError as e:
+        message = e.stderr.decode(errors="ignore").strip().splitlines() or ["ffmpeg exited with an error"]
+        raise RuntimeError(f"Failed to decode audio: {message[-1]}") from e
+    samples = np.frombuffer(process.stdout, np.int16).flatten().astype(np.float32) / 32768.0
+    silences = []
+    if detect_silence:
+        duration = len(samples) / SAMPLE_RATE
+        start = None
+        for line in process.stderr.decode(errors="ignore").splitlines():
+            match = _SILENCE_START.search(line)
+            if match:
+                start = max(0.0, float(match.group(1)))
+                continue
+            match = _SILENCE_END.search(line)
+            if match and start is not None:
+                silences.append((start, float(match.group(1))))
+                start = None
+        if start is not None:
+            silences.append((start, duration))
+    return samples, silences
+
+
+def trim_silences(samples, silences, min_silence=AUDIO_TRIM_MIN_SILENCE, padding=AUDIO_TRIM_PADDING):
+    """
+    Removes leading and trailing silence and shortens internal silences of at least min_silence
+    seconds to 2 * padding. Returns (trimmed, spans) where spans lists the kept stretches as
+    (source_start, trimmed_start, length) in seconds, for mapping times back to the recording.
+    """
+    duration = len(samples) / SAMPLE_RATE
+    kept, cursor = [], 0.0
+    for start, end in silences:
+        if end - start < min_silence:
+            continue
+        cut_start = 0.0 if start <= 0.01 else start + padding
+        cut_end = duration if end >= duration - 0.01 else end - padding
+        if cut_end > cut_start:
+            kept.append((cursor, cut_start))
+            cursor = cut_end
+    kept.append((cursor, duration))
+    spans, pieces, position = [], [], 0.0
+    for start, end in kept:
+        piece = samples[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+        if not len(piece):
+            continue
+        spans.append((start, position, len(piece) / SAMPLE_RATE))
+        pieces.append(piece)
+        position += len(piece) / SAMPLE_RATE
+    trimmed = np.concatenate(pieces) if pieces else samples[:0]
+    return trimmed, spans
+
+
+def trimmed_time(spans, source_time):
+    """
+    Maps a time in the recording to the trimmed audio; times inside a cut map to the cut point.
+    """
+    index = max(0, bisect.bisect_right([span[0] for span in spans], source_time) - 1)
+    source_start, trimmed_start, length = spans[index]
+    return trimmed_start + min(max(0.0, source_time - source_start), length)
+
+
+def source_time(spans, trimmed):
+    """
+    Maps a time in the trimmed audio back to the original recording.
+    """
+    index = max(0, bisect.bisect_right([span[1] for span in spans], trimmed) - 1)
+    source_start, trimmed_start, _ = spans[index]
+    return source_start + trimmed - trimmed_start
+
+
+def preprocess_audio(filepath):
+    """
+    Decodes a recording in one ffmpeg run to 16 kHz mono samples in memory and, with AUDIO_TRIM_SILENCE,
+    trims its silences. Returns (samples, silences, spans): silences are the silent stretches of the
+    returned samples (for choosing chunk boundaries) and spans map their times back to the recording.
+    """
+    samples, silences = decode_audio(filepath, detect_silence=True, noise_db=AUDIO_SILENCE_DB)
+    if not AUDIO_TRIM_SILENCE or not len(samples):
+        return samples, silences, [(0.0, 0.0, len(samples) / SAMPLE_RATE)]
+    trimmed, spans = trim_silences(samples, silences)
+    if not spans:
+        return trimmed, [], [(0.0, 0.0, 0.0)]
+    remaining = [(trimmed_time(spans, start), trimmed_time(spans, end)) for start, end in silences]
+    return trimmed, [(start, end) for start, end in remaining if end > start], spans
@@ -0,0 +1,84 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+
+# Local SQLite file holding each rep's submitted interactions until they download them; the Flask
+# session cookie only carries the batch ID. WAL mode lets several gunicorn workers share the file.
+BATCH_STORE_PATH = os.environ.get('BATCH_STORE_PATH', os.path.join('data', 'submissions.sqlite3'))
+BATCH_MAX_AGE_SECONDS = int(os.environ.get('BATCH_MAX_AGE_SECONDS', 7 * 24 * 3600))
+
+_initialized = False
+
+
+def _connect():
+    global _initialized
+    if not _initialized:
+        os.makedirs(os.path.dirname(BATCH_STORE_PATH) or '.', exist_ok=True)
+    connection = sqlite3.connect(BATCH_STORE_PATH, timeout=10)
+    if not _initialized:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS submitted_interaction (
+                Batch_ID TEXT NOT NULL,
+                Position INTEGER NOT NULL,
+                Record TEXT NOT NULL,
+                Created_At REAL NOT NULL,
+                PRIMARY KEY (Batch_ID, Position)
+            )
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS idx_submitted_created ON submitted_interaction (Created_At)")
+        connection.commit()
+        _initialized = True
+    return connection
+
+
+def new_batch_id():
+    return uuid.uuid4().hex
+
+
+def append_records(batch_id, records):
+    """
+    Adds records to the end of a batch and drops batches older than BATCH_MAX_AGE_SECONDS.
+    """
+    if not records:
+        return
+    connection = _connect()
+    try:
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent appends cannot pick the same positions.
+        connection.execute("BEGIN IMMEDIATE")
+        with connection:
+            now = time.time()
+            connection.execute("DELETE FROM submitted_interaction WHERE Created_At < ?", (now - BATCH_MAX_AGE_SECONDS,))
+            start = connection.execute("SELECT COALESCE(MAX(Position) + 1, 0) FROM submitted_interaction WHERE Batch_ID = ?",
+                                       (batch_id,)).fetchone()[0]
+            connection.executemany(
+                "INSERT INTO submitted_interaction (Batch_ID, Position, Record, Created_At) VALUES (?, ?, ?, ?)",
+                [(batch_id, start + offset, json.dumps(record, default=str), now) for offset, record in enumerate(records)])
+    finally:
+        connection.close()
+
+
+def load_records(batch_id):
+    """
+    Returns the batch's records in submission order (an empty list for unknown batches).
+    """
+    if not batch_id:
+        return []
+    connection = _connect()
+    try:
+        rows = connection.execute("SELECT Record FROM submitted_interaction WHERE Batch_ID = ? ORDER BY Position",
+                                  (batch_id,)).fetchall()
+    finally:
+        connection.close()
+    return [json.loads(row[0]) for row in rows]
+
+
+def clear_batch(batch_id):
+    connection = _connect()
+    try:
+        with connection:
+            connection.execute("DELETE FROM submitted_interaction WHERE Batch_ID = ?", (batch_id,))
+    finally:
+        connection.close()
@@ -0,0 +1,61 @@
+"""
+Checks that two NER backends agree on sample transcripts and compares their latency.
+
+The entities each backend finds (entity group, word and character offsets, in order) must match on every
+transcript; the script exits non-zero otherwise, so it can gate switching NER_BACKEND in a deployment.
+The offsets are compared too because the extractors use them, e.g. to pick the ORG after a negation.
+
+Usage:
+    python -m benchmarks.bench_ner --baseline transformers --candidate onnx [transcripts.txt]
+"""
+import argparse
+import os
+import sys
+import time
+
+from ner_backends import BACKENDS, load_backend
+
+SAMPLE_TRANSCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_transcripts.txt')
+
+
+def entity_signature(entities):
+    return [(entity["entity_group"], entity["word"].strip(), int(entity["start"]), int(entity["end"]))
+            for entity in entities]
+
+
+def time_backend(pipe, notes, repeats):
+    pipe(notes[0])  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        results = [pipe(note) for note in notes]
+    return results, (time.perf_counter() - start) / (repeats * len(notes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("transcripts", nargs="?", default=SAMPLE_TRANSCRIPTS, help="one transcript per line")
+    parser.add_argument("--baseline", default="transformers", choices=list(BACKENDS))
+    parser.add_argument("--candidate", default="onnx", choices=list(BACKENDS))
+    parser.add_argument("--model", default=os.environ.get('NER_MODEL', 'dslim/bert-base-NER'))
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.transcripts, "r", encoding="utf-8") as f:
+        notes = [line.strip() for line in f if line.strip()]
+    baseline, baseline_latency = time_backend(load_backend(args.baseline, args.model), notes, args.repeats)
+    candidate, candidate_latency = time_backend(load_backend(args.candidate, args.model), notes, args.repeats)
+
+    mismatches = 0
+    for index, (expected, actual) in enumerate(zip(baseline, candidate)):
+        if entity_signature(expected) != entity_signature(actual):
+            mismatches += 1
+            print(f"Transcript {index + 1} differs:\n  {args.baseline}: {entity_signature(expected)}\n"
+                  f"  {args.candidate}: {entity_signature(actual)}")
+    print(f"{args.baseline}: {baseline_latency * 1000:.1f} ms/note, {args.candidate}: "
+          f"{candidate_latency * 1000:.1f} ms/note ({baseline_latency / candidate_latency:.2f}x)")
+    print(f"Parity: {len(notes) - mismatches}/{len(notes)} transcripts identical")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
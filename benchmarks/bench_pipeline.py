@@ -0,0 +1,282 @@
+"""
+End-to-end benchmark of the upload -> review -> submit pipeline against a seeded local SQLite stand-in
+for the database (benchmarks/local_db.py), on synthetic recordings and transcripts.
+
+Each stage is timed per call (preprocess, transcription, extract_fields, clean_clinic_name, match_clinic,
+fuzzy_match_clinic, insert_interaction, bulk insert), then the Flask routes are driven through the test
+client. Latency percentiles and throughput are printed and compared with a stored baseline; --stub
+swaps in fast speech/NER stand-ins so runs take seconds.
+
+Usage:
+    python -m benchmarks.bench_pipeline --stub --clinics 10000
+    python -m benchmarks.bench_pipeline --stub --clinics 1000 --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_pipeline --clinics 100000 --recordings 8 --fail-on-regression
+"""
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import wave
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+from benchmarks import local_db, stubs
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+NOTE_TEMPLATES = [
+    "Hi, this is {rep}. I visited {clinic} today and met {contact} about {product}. "
+    "I left some samples with them. We will follow up next week. They came in through a referral.",
+    "{rep} here. Stopped by {clinic_typo} to talk about {product}. I meant to but didn't leave samples. "
+    "Still working on it, they found us through the web form.",
+    "This is {rep}. Not {other_clinic}, it's {clinic}. Spoke with {contact} on {product}. "
+    "They received samples. No need to follow up, closed and converted.",
+    "{rep} checking in from {unknown_clinic}. Discussed {product} with {contact}, first time meeting them. "
+    "Will call again after the trade show.",
+]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.wall = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[name].append(time.perf_counter() - started)
+
+    def summary(self):
+        stages = {}
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            total = self.wall.get(name, sum(samples))
+            stages[name] = {"n": len(samples), "mean_ms": statistics.fmean(samples) * 1000,
+                            "p50_ms": _percentile(ordered, 50) * 1000, "p90_ms": _percentile(ordered, 90) * 1000,
+                            "p99_ms": _percentile(ordered, 99) * 1000, "max_ms": ordered[-1] * 1000,
+                            "throughput_per_s": len(samples) / total if total else 0.0}
+        return stages
+
+
+def _percentile(ordered, percent):
+    return float(np.percentile(ordered, percent)) if ordered else 0.0
+
+
+def make_transcripts(count, clinic_names, rep_names, rng):
+    notes = []
+    for index in range(count):
+        clinic, other = rng.sample(clinic_names, 2)
+        typo_at = rng.randrange(3, max(4, len(clinic) - 2))
+        notes.append(NOTE_TEMPLATES[index % len(NOTE_TEMPLATES)].format(
+            rep=rng.choice(rep_names), clinic=clinic, other_clinic=other,
+            clinic_typo=clinic[:typo_at] + clinic[typo_at + 1:], unknown_clinic=f"Zephyr {index} Animal Clinic",
+            contact=f"Dr. {rng.choice(['Patel', 'Nguyen', 'Okafor', 'Rossi'])}", product=rng.choice(local_db.PRODUCTS)))
+    return notes
+
+
+def make_recording(path, seconds, rng, rate=48000):
+    """
+    Writes a stereo 48 kHz WAV of tone bursts with leading, internal and trailing silence, so decoding,
+    resampling, downmixing and silence trimming all do real work.
+    """
+    t = np.arange(int(rate * seconds)) / rate
+    signal = 0.3 * np.sin(2 * np.pi * rng.uniform(180, 400) * t)
+    envelope = np.ones_like(t)
+    for start, end in [(0, 1.0), (seconds * 0.5 - 1.0, seconds * 0.5 + 1.0), (seconds - 1.0, seconds)]:
+        envelope[int(start * rate):int(end * rate)] = 0
+    pcm = (signal * envelope * 32767).astype(np.int16)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(np.repeat(pcm, 2).tobytes())
+
+
+def bench_stages(recorder, recordings, notes, repeats):
+    from app import clean_clinic_name, extract_fields
+    from audio import preprocess_audio
+    from db_utils import borrow_connection, fuzzy_match_clinic, insert_interaction, insert_interactions_bulk, \
+        match_clinic
+    from transcription import transcribe_file
+
+    for path in recordings:
+        with recorder.stage("preprocess_audio"):
+            preprocess_audio(path)
+        with recorder.stage("transcribe_file"):
+            transcribe_file(path)
+    extracted_notes = []
+    for _ in range(repeats):
+        for note in notes:
+            with recorder.stage("extract_fields"):
+                extracted = extract_fields(note)
+            with recorder.stage("clean_clinic_name"):
+                extracted["Clinic_Name"] = clean_clinic_name(extracted["Clinic_Name"])
+            extracted_notes.append(extracted)
+    with borrow_connection() as connection:
+        fuzzy_match_clinic("warm up", connection)  # loads the clinic index outside the timings
+        matched = []
+        for extracted in extracted_notes:
+            with recorder.stage("match_clinic"):
+                clinic = match_clinic(extracted["Clinic_Name"], connection)
+            if not clinic:
+                with recorder.stage("fuzzy_match_clinic"):
+                    clinic = fuzzy_match_clinic(extracted["Clinic_Name"], connection)
+            if clinic:
+                matched.append((clinic["Clinic_ID"], extracted))
+        for clinic_id, extracted in matched:
+            with recorder.stage("insert_interaction"):
+                insert_interaction(clinic_id, dict(extracted, Interaction_Date="2025-01-02"), connection)
+                connection.commit()
+        for start in range(0, len(matched), 50):
+            batch = [(clinic_id, dict(extracted, Interaction_Date="2025-01-03"))
+                     for clinic_id, extracted in matched[start:start + 50]]
+            with recorder.stage("insert_interactions_bulk[50]"):
+                results = insert_interactions_bulk(batch, connection)
+                connection.commit()
+            # The stand-in's cursors run executemany() through the app's timed cursor like PyMySQL does,
+            # so a statement the timing layer cannot handle shows up here rather than only in production.
+            failed = [result["error"] for result in results if result["status"] == "failed"]
+            if failed:
+                raise RuntimeError(f"Bulk insert failed for {len(failed)} of {len(batch)} rows: {failed[0]}")
+
+
+def bench_routes(recorder, recordings, clinic_names, iterations, files_per_upload, cache_dir):
+    import app as app_module
+    client = app_module.app.test_client()
+    for iteration in range(iterations):
+        shutil.rmtree(cache_dir, ignore_errors=True)  # every upload is transcribed, not served from cache
+        batch = [recordings[(iteration * files_per_upload + offset) % len(recordings)]
+                 for offset in range(files_per_upload)]
+        with recorder.stage(f"POST / + job [{files_per_upload} files]"):
+            response = client.post("/", data={"files": [(io.BytesIO(open(path, "rb").read()), os.path.basename(path))
+                                                          for path in batch]}, content_type="multipart/form-data")
+            status_url = response.get_json()["status_url"]
+            while client.get(status_url).get_json()["status"] in ("queued", "running"):
+                time.sleep(0.005)
+        with recorder.stage("GET /jobs/<id>/review"):
+            client.get(response.get_json()["review_url"])
+        results = [result for result in app_module.get_job(response.get_json()["job_id"])["results"]
+                   if result and result["match_type"] != "new"]
+        form = {"count": str(len(results)), "new_clients_json": "[]"}
+        for index, result in enumerate(results):
+            form.update({f"clinic_id_{index}": result.get("clinic_id", ""), f"clinic_name_{index}": result["Clinic_Name"],
+                         f"rep_name_{index}": result["Rep_Name"], f"product_interest_{index}": result["Product_Interest"],
+                         f"samples_given_{index}": result["Samples_Given"], f"follow_up_{index}": result["Follow_Up"],
+                         f"status_{index}": result["Status"], f"lead_source_{index}": result["Lead_Source"],
+                         f"filename_{index}": result["filename"]})
+        with recorder.stage("POST /submit_existing"):
+            client.post("/submit_existing", data=form)
+    rng = random.Random(7)
+    for _ in range(iterations * 20):
+        with recorder.stage("GET /get_clinic_list"):
+            client.get("/get_clinic_list", query_string={"q": rng.choice(clinic_names)[:rng.randint(2, 8)]})
+    for _ in range(iterations * 5):
+        with recorder.stage("GET /get_product_list"):
+            client.get("/get_product_list")
+    with recorder.stage("GET /export_interactions (csv)"):
+        size = sum(len(chunk) for chunk in client.get("/export_interactions?format=csv").response)
+    print(f"Exported {size / 1e6:.1f} MB of CSV")
+
+
+def print_report(stages, baseline, tolerance):
+    """
+    Prints the stage table; with a baseline, adds the p50 change and returns the regressed stages.
+    """
+    regressions = []
+    print(f"\n{'stage':<34} {'n':>5} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'ops/s':>9}"
+          + ("  p50 vs baseline" if baseline else ""))
+    for name, stats in stages.items():
+        line = (f"{name:<34} {stats['n']:>5} {stats['p50_ms']:>9.2f} {stats['p90_ms']:>9.2f} "
+                f"{stats['p99_ms']:>9.2f} {stats['throughput_per_s']:>9.1f}")
+        reference = (baseline or {}).get(name)
+        if reference and reference["p50_ms"] > 0:
+            change = stats["p50_ms"] / reference["p50_ms"] - 1
+            line += f"  {change:+7.1%}"
+            if change > tolerance:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clinics", type=int, default=1000, help="seeded clinic rows (e.g. 1000, 10000, 100000)")
+    parser.add_argument("--interactions", type=int, default=20000, help="seeded crm_interaction rows")
+    parser.add_argument("--recordings", type=int, default=6, help="synthetic recordings to generate")
+    parser.add_argument("--seconds", type=float, default=12.0, help="length of each synthetic recording")
+    parser.add_argument("--notes", type=int, default=40, help="synthetic transcripts for the text stages")
+    parser.add_argument("--repeats", type=int, default=3, help="passes over the transcripts")
+    parser.add_argument("--route-iterations", type=int, default=3)
+    parser.add_argument("--files-per-upload", type=int, default=4)
+    parser.add_argument("--stub", action="store_true", help="use the fast speech/NER stand-ins")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="stored results to compare with")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write this run's results to PATH")
+    parser.add_argument("--output", metavar="PATH", help="write this run's results as JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 slowdown before flagging")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-pipeline-")
+    # Everything the app writes goes to the scratch directory; these settings are read at import.
+    os.environ.setdefault("BATCH_STORE_PATH", os.path.join(workdir, "submissions.sqlite3"))
+    os.environ.setdefault("TRANSCRIPTION_CACHE_DIR", os.path.join(workdir, "cache"))
+    try:
+        rng = random.Random(1)
+        database = os.path.join(workdir, "crm.sqlite3")
+        started = time.perf_counter()
+        clinic_names, rep_names = local_db.seed(database, clinics=args.clinics, interactions=args.interactions)
+        local_db.install(database)
+        print(f"Seeded {args.clinics} clinics and {args.interactions} interactions in "
+              f"{time.perf_counter() - started:.1f}s")
+        notes = make_transcripts(args.notes, clinic_names, rep_names, rng)
+        recordings = []
+        for index in range(args.recordings):
+            path = os.path.join(workdir, f"recording_{index}.wav")
+            make_recording(path, args.seconds + index * 0.37, rng)
+            recordings.append(path)
+        if args.stub:
+            stubs.install(notes)
+
+        import app as app_module
+        app_module.app.config["UPLOAD_FOLDER"] = os.path.join(workdir, "uploads")
+        recorder = Recorder()
+        bench_stages(recorder, recordings, notes, args.repeats)
+        bench_routes(recorder, recordings, clinic_names, args.route_iterations, args.files_per_upload,
+                     os.environ["TRANSCRIPTION_CACHE_DIR"])
+
+        stages = recorder.summary()
+        config = {"clinics": args.clinics, "interactions": args.interactions, "recordings": args.recordings,
+                  "seconds": args.seconds, "notes": args.notes, "repeats": args.repeats, "stub": args.stub}
+        baseline = None
+        if args.baseline and os.path.exists(args.baseline) and not args.save_baseline:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored["config"] != config:
+                print(f"Note: baseline was recorded with {stored['config']}")
+            baseline = stored["stages"]
+        regressions = print_report(stages, baseline, args.tolerance)
+        for path in filter(None, [args.output, args.save_baseline]):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"config": config, "stages": stages}, f, indent=2)
+            print(f"Results written to {path}")
+        if regressions:
+            print(f"{len(regressions)} stage(s) slower than the baseline by more than {args.tolerance:.0%}")
+            if args.fail_on_regression:
+                sys.exit(1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
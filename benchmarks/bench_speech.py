@@ -0,0 +1,71 @@
+"""
+Compares speech backends on sample recordings: model load time, transcription latency, real-time
+factor (processing seconds per audio second) and transcript agreement with the first backend.
+
+Usage:
+    python -m benchmarks.bench_speech samples/ --backends whisper faster-whisper --model base --threads 4
+"""
+import argparse
+import os
+import time
+
+from rapidfuzz import fuzz
+
+from audio import SAMPLE_RATE, decode_audio
+from speech_backends import BACKENDS, load_backend
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.m4a')
+
+
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.lower().endswith(AUDIO_EXTENSIONS))
+        else:
+            files.append(path)
+    return files
+
+
+def run_backend(name, model, threads, compute_type, recordings):
+    start = time.perf_counter()
+    backend = load_backend(name, model, threads=threads, compute_type=compute_type)
+    load_seconds = time.perf_counter() - start
+    texts, latencies = [], []
+    for path, samples in recordings:
+        start = time.perf_counter()
+        texts.append(backend.transcribe(samples)["text"].strip())
+        latencies.append(time.perf_counter() - start)
+        print(f"  {name}: {os.path.basename(path)} in {latencies[-1]:.2f}s")
+    return {"backend": name, "load_seconds": load_seconds, "latencies": latencies, "texts": texts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="audio files or directories of recordings")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--model", default=os.environ.get('WHISPER_MODEL', 'base'))
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--compute-type", default="int8")
+    args = parser.parse_args()
+
+    files = collect_files(args.paths)
+    if not files:
+        parser.error("no recordings found")
+    recordings = [(path, decode_audio(path)[0]) for path in files]
+    audio_seconds = sum(len(samples) for _, samples in recordings) / SAMPLE_RATE
+    print(f"{len(recordings)} recording(s), {audio_seconds:.1f}s of audio")
+
+    runs = [run_backend(name, args.model, args.threads, args.compute_type, recordings) for name in args.backends]
+    baseline = runs[0]
+    print(f"\n{'backend':<16}{'load s':>8}{'total s':>9}{'RTF':>7}{'speedup':>9}{'agreement':>11}")
+    for run in runs:
+        total = max(sum(run["latencies"]), 1e-9)
+        agreement = sum(fuzz.ratio(a.lower(), b.lower()) for a, b in zip(run["texts"], baseline["texts"]))
+        print(f"{run['backend']:<16}{run['load_seconds']:>8.2f}{total:>9.2f}{total / audio_seconds:>7.3f}"
+              f"{sum(baseline['latencies']) / total:>8.2f}x{agreement / len(recordings):>10.1f}%")
+
+
+if __name__ == '__main__':
+    main()
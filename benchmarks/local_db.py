@@ -0,0 +1,224 @@
+"""
+SQLite stand-in for the MySQL database, for benchmarks and local runs without a server.
+
+LocalConnection mimics the slice of PyMySQL the app uses (DictCursor rows, %s placeholders,
+rowcount, commit/rollback/ping) and rewrites the MySQL-only SQL the app issues into SQLite. Its
+cursors are timed like the app's own, and executemany() passes statements to execute() the way
+PyMySQL does, so the timing layer sees the same query types as against MySQL.
+install() points db_utils at a database file; seed() fills one with synthetic clinics, reps,
+products and interactions.
+"""
+import random
+import re
+import sqlite3
+from datetime import datetime, timedelta
+
+from pymysql.cursors import RE_INSERT_VALUES
+
+from db_utils import TimedCursorMixin
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clinic (
+    Clinic_ID TEXT PRIMARY KEY, Clinic_Name TEXT, Clinic_Type TEXT, Industry TEXT, Clinic_Address TEXT,
+    Region TEXT, Parent_Company TEXT, Contact_Name TEXT
+);
+CREATE TABLE IF NOT EXISTS sales_rep (Sales_Rep_ID TEXT PRIMARY KEY, Rep_Name TEXT);
+CREATE TABLE IF NOT EXISTS product (Product_ID TEXT PRIMARY KEY, Product_Name TEXT);
+CREATE TABLE IF NOT EXISTS crm_interaction (
+    Interaction_ID INTEGER PRIMARY KEY AUTOINCREMENT, Clinic_ID TEXT, Contact_Name TEXT, Sales_Rep_ID TEXT,
+    Product_ID TEXT, Samples_Given TEXT, Follow_Up TEXT, Status TEXT, Interaction_Date TEXT,
+    Additional_Notes TEXT, CRM_Created_Date TEXT, Lead_Source TEXT, Last_Contacted TEXT,
+    Interaction_Day TEXT GENERATED ALWAYS AS (date(Interaction_Date)) STORED
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_crm_interaction_day
+    ON crm_interaction (Clinic_ID, Sales_Rep_ID, Product_ID, Interaction_Day);
+CREATE INDEX IF NOT EXISTS idx_crm_interaction_date ON crm_interaction (Interaction_Date);
+CREATE TABLE IF NOT EXISTS id_sequence (Sequence_Name TEXT PRIMARY KEY, Next_Value INTEGER NOT NULL);
+"""
+
+PRODUCTS = ["Canine Vaccines", "Dental Cleaning Kits", "Deworming Tablets", "Diagnostic Equipment",
+            "Feline Vaccines", "Flea & Tick Prevention Kits", "Joint Support Supplements",
+            "Pain Relief Medication", "Post-Surgery Antibiotics"]
+REGIONS = ["North", "South", "East", "West", "Central"]
+_NAME_WORDS = ["Sunshine", "Happy", "Paws", "Oak", "River", "City", "Central", "North", "Green", "Valley", "Maple",
+               "Pine", "Bright", "Lake", "Hill", "Sunset", "Golden", "Blue", "Harbor", "Meadow", "Cedar", "Willow"]
+_NAME_KINDS = ["Veterinary Clinic", "Animal Hospital", "Pet Care Center", "Vet Practice", "Animal Clinic"]
+_FIRST_NAMES = ["John", "Maria", "David", "Sarah", "Michael", "Emily", "James", "Laura", "Robert", "Anna"]
+_LAST_NAMES = ["Smith", "Garcia", "Johnson", "Lee", "Brown", "Martinez", "Davis", "Wilson", "Clark", "Lopez"]
+
+_PLACEHOLDER = re.compile(r"%s")
+_DATE_ADD_DAY = re.compile(r"DATE_ADD\(\s*([^,]+?)\s*,\s*INTERVAL 1 DAY\s*\)", re.IGNORECASE)
+_UPSERT_NO_OP = re.compile(r"ON DUPLICATE KEY UPDATE \w+ = \w+\s*$", re.IGNORECASE)
+_BUMP_SEQUENCE = re.compile(r"SET Next_Value = LAST_INSERT_ID\((.+?)\) WHERE", re.IGNORECASE)
+_INDEX_LOOKUP = re.compile(r"FROM information_schema\.statistics\s+WHERE table_schema = DATABASE\(\) AND "
+                           r"table_name = ('\w+')\s+AND index_name = ('\w+')", re.IGNORECASE)
+
+
+def translate(sql):
+    """
+    Rewrites the MySQL dialect used by the app into SQLite.
+    """
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _DATE_ADD_DAY.sub(r"date(\1, '+1 day')", sql)
+    sql = sql.replace("NOW()", "datetime('now')").replace("INSERT IGNORE", "INSERT OR IGNORE")
+    sql = _UPSERT_NO_OP.sub("ON CONFLICT DO NOTHING", sql)
+    sql = _INDEX_LOOKUP.sub(r"FROM sqlite_master WHERE type = 'index' AND tbl_name = \1 AND name = \2", sql)
+    return sql
+
+
+def clinic_names(count, rng):
+    """
+    Unique, realistic-looking clinic names; a running number keeps large sets unique.
+    """
+    return [f"{rng.choice(_NAME_WORDS)} {rng.choice(_NAME_WORDS)} {rng.choice(_NAME_KINDS)}"
+            + (f" {index // 500}" if index >= 500 else "") for index in range(count)]
+
+
+def rep_names(count):
+    return [f"{_FIRST_NAMES[index % 10]} {_LAST_NAMES[(index // 10) % 10]}" + (f" {index // 100}" if index >= 100 else "")
+            for index in range(count)]
+
+
+class SqliteCursor:
+    def __init__(self, connection):
+        self._connection = connection
+        self._cursor = connection.sqlite.cursor()
+        self.rowcount = -1
+        self._rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, sql, params=()):
+        if isinstance(sql, bytearray):
+            # The multi-row statement built by executemany(), carrying every row's parameters.
+            self._cursor.executemany(translate(sql.decode("utf-8")), params)
+            self.rowcount = self._cursor.rowcount
+            self._rows = None
+            return self.rowcount
+        params = tuple(params or ())
+        if "LAST_INSERT_ID()" in sql:
+            self._rows = [{"end_value": self._connection.last_insert_id}]
+            return 1
+        bump = _BUMP_SEQUENCE.search(sql)
+        if bump:
+            # LAST_INSERT_ID(expr) stores expr for this connection; RETURNING gives the same value.
+            sql = _BUMP_SEQUENCE.sub(f"SET Next_Value = {bump.group(1)} WHERE", sql) + " RETURNING Next_Value"
+            rows = self._cursor.execute(translate(sql), params).fetchall()
+            self.rowcount = len(rows)
+            if rows:
+                self._connection.last_insert_id = rows[0][0]
+            self._rows = []
+            return self.rowcount
+        self._cursor.execute(translate(sql), params)
+        self.rowcount = self._cursor.rowcount
+        self._rows = None
+        return self.rowcount
+
+    def executemany(self, sql, seq_of_params):
+        # PyMySQL sends INSERT ... VALUES as one multi-row statement, built as a bytearray, and runs
+        # anything else once per parameter tuple.
+        if RE_INSERT_VALUES.match(sql):
+            return self.execute(bytearray(sql, "utf-8"), [tuple(params) for params in seq_of_params])
+        self.rowcount = sum(self.execute(sql, params) for params in seq_of_params)
+        return self.rowcount
+
+    def _take(self, size=None):
+        if self._rows is not None:
+            rows = self._rows if size is None else self._rows[:size]
+            self._rows = None if size is None else self._rows[size:]
+            return rows
+        if self._cursor.description is None:
+            return []
+        columns = [column[0] for column in self._cursor.description]
+        raw = self._cursor.fetchall() if size is None else self._cursor.fetchmany(size)
+        return [dict(zip(columns, row)) for row in raw]
+
+    def fetchone(self):
+        rows = self._take(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size=1):
+        return self._take(size)
+
+    def fetchall(self):
+        return self._take()
+
+    def close(self):
+        self._cursor.close()
+
+
+class LocalCursor(TimedCursorMixin, SqliteCursor):
+    pass
+
+
+class LocalConnection:
+    def __init__(self, path):
+        self.sqlite = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.sqlite.execute("PRAGMA journal_mode=WAL")
+        self.last_insert_id = 0
+
+    def cursor(self, cursorclass=None):
+        return LocalCursor(self)
+
+    def commit(self):
+        self.sqlite.commit()
+
+    def rollback(self):
+        self.sqlite.rollback()
+
+    def ping(self, reconnect=True):
+        pass
+
+    def close(self):
+        self.sqlite.close()
+
+
+def seed(path, clinics=1000, reps=50, interactions=0, random_seed=42):
+    """
+    Creates a fresh database with synthetic rows and returns the generated clinic and rep names.
+    """
+    rng = random.Random(random_seed)
+    connection = sqlite3.connect(path)
+    connection.executescript(";".join(f"DROP TABLE IF EXISTS {table}" for table in
+                                      ("clinic", "sales_rep", "product", "crm_interaction", "id_sequence")) + ";" + SCHEMA)
+    names, reps_list = clinic_names(clinics, rng), rep_names(reps)
+    connection.executemany("INSERT INTO clinic VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           [(f"C{index + 1:03d}", name, "Small Animal", "Veterinary", f"{index + 1} Main St",
+                             rng.choice(REGIONS), None, f"{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)}")
+                            for index, name in enumerate(names)])
+    connection.executemany("INSERT INTO sales_rep VALUES (?, ?)",
+                           [(f"SR{index + 1:03d}", name) for index, name in enumerate(reps_list)])
+    connection.executemany("INSERT INTO product VALUES (?, ?)",
+                           [(f"P{index + 1:03d}", name) for index, name in enumerate(PRODUCTS)])
+    start = datetime(2024, 1, 1)
+    connection.executemany(
+        "INSERT OR IGNORE INTO crm_interaction (Clinic_ID, Contact_Name, Sales_Rep_ID, Product_ID, Samples_Given, Follow_Up, "
+        "Status, Interaction_Date, Additional_Notes, CRM_Created_Date, Lead_Source, Last_Contacted) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(f"C{rng.randrange(clinics) + 1:03d}", "", f"SR{rng.randrange(reps) + 1:03d}",
+          f"P{rng.randrange(len(PRODUCTS)) + 1:03d}", "Yes", "No", "Working",
+          (start + timedelta(minutes=17 * index)).strftime("%Y-%m-%d %H:%M:%S"), "", "2024-01-01 00:00:00",
+          "Referral", None) for index in range(interactions)])
+    connection.executemany("INSERT INTO id_sequence VALUES (?, ?)", [("clinic", clinics + 1), ("sales_rep", reps + 1)])
+    connection.commit()
+    connection.close()
+    return names, reps_list
+
+
+def install(path):
+    """
+    Routes db_utils (its pool, get_connection and the export cursor) to the SQLite file at path and
+    drops everything cached from a previous database.
+    """
+    import db_utils
+    db_utils.get_connection = lambda: LocalConnection(path)
+    db_utils._pool = db_utils.ConnectionPool()
+    db_utils.id_allocator._blocks.clear()
+    db_utils.id_allocator._connection = None
+    db_utils._interaction_key_checked = False
+    db_utils.clinic_index.invalidate()
+    db_utils.reference_cache.invalidate()
@@ -0,0 +1,59 @@
+"""
+Fast stand-ins for the speech and NER models, so the rest of the pipeline can be measured in seconds.
+
+install() swaps them into models for this process and keeps transcription in-process (worker
+processes would load the real models).
+"""
+import re
+
+_CAPITALIZED_RUN = re.compile(r"[A-Z][A-Za-z&'-]*(?: (?:[A-Z][A-Za-z&'-]*|\d+))*")
+_ORG_WORDS = {"Clinic", "Hospital", "Center", "Practice", "Veterinary", "Vet", "Animal", "Care"}
+
+
+class StubSpeech:
+    """
+    Returns one of the fixture transcripts, picked by the number of samples so every recording
+    always gets the same text.
+    """
+    name = "stub"
+
+    def __init__(self, transcripts):
+        self.transcripts = transcripts
+
+    def transcribe(self, audio, **options):
+        text = self.transcripts[len(audio) % len(self.transcripts)]
+        return {"text": text, "segments": [{"id": 0, "start": 0.0, "end": len(audio) / 16000, "text": text}],
+                "language": "en"}
+
+
+def _entities(note):
+    entities = []
+    for match in _CAPITALIZED_RUN.finditer(note):
+        words = match.group(0).split(" ")
+        if _ORG_WORDS & set(words):
+            group = "ORG"
+        elif len(words) >= 2:
+            group = "PER"
+        else:
+            continue
+        entities.append({"entity_group": group, "word": match.group(0), "start": match.start(), "end": match.end(),
+                         "score": 0.99})
+    return entities
+
+
+def stub_ner(texts, **options):
+    """
+    Tags runs of capitalised words: ORG when they contain a clinic word, PER when two or more words long.
+    Accepts one note or a list, like the transformers pipeline.
+    """
+    if isinstance(texts, str):
+        return _entities(texts)
+    return [_entities(text) for text in texts]
+
+
+def install(transcripts):
+    import models
+    import transcription
+    models._speech_backend = StubSpeech(transcripts)
+    models._ner_model = stub_ner
+    transcription.TRANSCRIBE_WORKERS = 0
@@ -0,0 +1,172 @@
+import bisect
+import heapq
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from metrics import inc
+
+# How long a loaded index is trusted before it is reloaded (picks up clinics inserted by other workers),
+# whether to prune candidates by shared trigrams, and how many threads rapidfuzz may use for scoring.
+CLINIC_INDEX_TTL = float(os.environ.get('CLINIC_INDEX_TTL', 300))
+CLINIC_INDEX_PRUNING = os.environ.get('CLINIC_INDEX_PRUNING', '0') == '1'
+CLINIC_INDEX_WORKERS = int(os.environ.get('CLINIC_INDEX_WORKERS', 1))
+# Typeahead falls back to fuzzy scoring of at most this many trigram-sharing clinics when exact matches run short.
+TYPEAHEAD_FUZZY_CANDIDATES = int(os.environ.get('TYPEAHEAD_FUZZY_CANDIDATES', 200))
+TYPEAHEAD_FUZZY_CUTOFF = float(os.environ.get('TYPEAHEAD_FUZZY_CUTOFF', 75))
+
+_WORD_START = re.compile(r"(?:^|(?<=[^a-z0-9]))[a-z0-9]")
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _word_tails(name):
+    """
+    The name from the start of each word onwards, so a sorted list of tails answers word-prefix lookups by bisection.
+    """
+    return [name[match.start():] for match in _WORD_START.finditer(name)]
+
+
+class ClinicIndex:
+    """
+    Process-local copy of the clinic table with lower-cased names, scored in bulk with rapidfuzz.
+    The state is replaced wholesale on every change, so readers never see a half-built index.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = ([], [], [], {}, [])  # ids, names, normalized names, trigram -> positions, sorted (tail, position)
+        self._loaded_at = 0.0
+
+    def is_stale(self):
+        return time.time() - self._loaded_at > CLINIC_INDEX_TTL
+
+    def load(self, connection):
+        """
+        Reloads every clinic from the database.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT Clinic_ID, Clinic_Name FROM clinic")
+            rows = cursor.fetchall()
+        ids = [row["Clinic_ID"] for row in rows]
+        names = [row["Clinic_Name"] or "" for row in rows]
+        normalized = [name.lower() for name in names]
+        trigrams, tails = {}, []
+        for position, name in enumerate(normalized):
+            for gram in _trigrams(name):
+                trigrams.setdefault(gram, []).append(position)
+            tails.extend((tail, position) for tail in _word_tails(name))
+        tails.sort()
+        with self._lock:
+            self._state = (ids, names, normalized, trigrams, tails)
+            self._loaded_at = time.time()
+
+    def ensure_loaded(self, connection):
+        if self.is_stale():
+            inc("crm_cache_requests_total", cache="clinic_index", result="reload")
+            self.load(connection)
+        else:
+            inc("crm_cache_requests_total", cache="clinic_index", result="hit")
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+    def add(self, clinic_id, clinic_name):
+        """
+        Appends a newly inserted clinic without reloading the whole table.
+        """
+        clinic_name = clinic_name or ""
+        with self._lock:
+            ids, names, normalized, trigrams, tails = self._state
+            position = len(ids)
+            trigrams, tails = dict(trigrams), list(tails)
+            for gram in _trigrams(clinic_name.lower()):
+                trigrams[gram] = trigrams.get(gram, []) + [position]
+            for tail in _word_tails(clinic_name.lower()):
+                bisect.insort(tails, (tail, position))
+            self._state = (ids + [clinic_id], names + [clinic_name], normalized + [clinic_name.lower()], trigrams,
+                           tails)
+
+    def _candidates(self, query, normalized, trigrams):
+        if not CLINIC_INDEX_PRUNING or len(query) < 3:
+            return None
+        positions = set()
+        for gram in _trigrams(query):
+            positions.update(trigrams.get(gram, ()))
+        return sorted(positions)
+
+    def best_match(self, clinic_name_partial, threshold=75):
+        """
+        Returns the clinic with the highest partial_ratio score, or None if it scores below threshold.
+        Scores are rounded to integers and ties go to the earliest clinic, as thefuzz did row by row.
+        """
+        ids, names, normalized, trigrams, _ = self._state
+        query = clinic_name_partial.lower()
+        positions = self._candidates(query, normalized, trigrams)
+        choices = normalized if positions is None else [normalized[p] for p in positions]
+        if not choices:
+            return None
+        inc("crm_clinic_index_rows_scanned_total", len(choices))
+        scores = process.cdist([query], choices, scorer=fuzz.partial_ratio, score_cutoff=threshold - 0.5,
+                               workers=CLINIC_INDEX_WORKERS)[0]
+        scores = np.rint(scores)
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+        position = best if positions is None else positions[best]
+        return {"Clinic_ID": ids[position], "Clinic_Name": names[position], "match_score": int(scores[best])}
+
+    def search(self, query, limit=10):
+        """
+        Typeahead lookup. Ranks clinics whose name starts with the query first, then those with a word
+        starting with it, then those containing it anywhere, and fills any remaining slots with
+        typo-tolerant partial_ratio matches among clinics sharing trigrams with the query.
+        Within a tier shorter names come first. Returns [{"Clinic_ID", "Clinic_Name"}].
+        """
+        ids, names, normalized, trigrams, tails = self._state
+        query = query.strip().lower()
+        if not query:
+            return []
+        ranked = {}  # position -> sort key; tiers are compared first, so a full set of higher tiers ends the search
+
+        def fill(tier, positions):
+            keys = ((tier, len(normalized[p]), normalized[p], p) for p in positions if p not in ranked)
+            for key in heapq.nsmallest(limit - len(ranked), keys):
+                ranked[key[3]] = key[:3]
+
+        start = bisect.bisect_left(tails, (query,))
+        end = bisect.bisect_left(tails, (query + "\uffff",), start)
+        word_prefixed = {position for _, position in tails[start:end]}
+        fill(0, (p for p in word_prefixed if normalized[p].startswith(query)))
+        if len(ranked) < limit:
+            fill(1, word_prefixed)
+        grams = _trigrams(query)
+        postings = sorted((trigrams.get(gram, ()) for gram in grams), key=len)
+        if len(ranked) < limit and postings:
+            # Every substring match contains all the query's trigrams, so the rarest one bounds the scan.
+            fill(2, (p for p in postings[0] if query in normalized[p]))
+        if len(ranked) < limit and postings:
+            # Grams shared by a large share of the clinics ("vet", "cli") add cost without telling candidates apart.
+            shared = Counter()
+            common = max(len(ids) // 10, TYPEAHEAD_FUZZY_CANDIDATES)
+            # Grams of a typo match nothing; they must not count as rare, or the fallback to all postings never fires.
+            for posting in [posting for posting in postings if posting and len(posting) <= common] or postings:
+                shared.update(posting)
+            candidates = [position for position, _ in shared.most_common(TYPEAHEAD_FUZZY_CANDIDATES)
+                          if position not in ranked]
+            matches = process.extract(query, [normalized[p] for p in candidates], scorer=fuzz.partial_ratio,
+                                      score_cutoff=TYPEAHEAD_FUZZY_CUTOFF, limit=limit - len(ranked))
+            for _, score, index in matches:
+                ranked[candidates[index]] = (3, -score, len(normalized[candidates[index]]))
+        best = sorted(ranked, key=ranked.get)[:limit]
+        return [{"Clinic_ID": ids[position], "Clinic_Name": names[position]} for position in best]
+
+
+clinic_index = ClinicIndex()
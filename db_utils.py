@@ -1,7 +1,69 @@
 import pymysql
 from datetime import datetime
 from thefuzz import fuzz
+from contextlib import contextmanager
+from clinic_index import clinic_index
+from reference_cache import reference_cache
+from id_allocator import IdAllocator
+from metrics import inc, observe, timed
 import os # Import the 'os' module to access environment variables
+import queue
+import re
+import threading
+import time
+from functools import lru_cache
+
+# Connection pool settings. Idle connections are pinged before reuse once they have been idle for
+# DB_POOL_PING_INTERVAL seconds, and replaced once they are older than DB_POOL_RECYCLE seconds.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+DB_POOL_PING_INTERVAL = float(os.environ.get('DB_POOL_PING_INTERVAL', 30))
+DB_POOL_RECYCLE = float(os.environ.get('DB_POOL_RECYCLE', 3600))
+
+_QUERY_LABEL = re.compile(r"\s*(select|insert|update|delete|replace)\b(?:.*?\b(?:from|into)\s)?\W*(\w+)",
+                          re.IGNORECASE | re.DOTALL)
+
+@lru_cache(maxsize=512)
+def query_label(query_start):
+    """
+    Metric labels for a statement: its type and the first table it names.
+    """
+    match = _QUERY_LABEL.match(query_start)
+    if not match:
+        return "other", "unknown"
+    return match.group(1).lower(), match.group(2).lower()
+
+class TimedCursorMixin:
+    """
+    Times every statement into crm_db_query_seconds and counts the rows it returned or changed.
+    Labels come from the start of the statement, so IN lists and multi-row VALUES do not add series.
+    """
+    _labels = ("other", "unknown")
+
+    def execute(self, query, args=None):
+        query_start = query[:500]
+        if not isinstance(query_start, str):
+            # executemany() hands multi-row INSERT ... VALUES statements over as a bytearray.
+            query_start = bytes(query_start).decode("utf-8", "replace")
+        statement, table = self._labels = query_label(query_start)
+        started = time.perf_counter()
+        try:
+            return super().execute(query, args)
+        finally:
+            observe("crm_db_query_seconds", time.perf_counter() - started, statement=statement, table=table)
+            # Unbuffered cursors report an unknown row count (2**64 - 1) until the result is read.
+            if 0 < self.rowcount < 2 ** 63:
+                inc("crm_db_rows_total", self.rowcount, statement=statement, table=table)
+
+class TimedDictCursor(TimedCursorMixin, pymysql.cursors.DictCursor):
+    pass
+
+class TimedSSDictCursor(TimedCursorMixin, pymysql.cursors.SSDictCursor):
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(size)
+        if rows:
+            inc("crm_db_rows_total", len(rows), statement=self._labels[0], table=self._labels[1])
+        return rows
 
 def get_connection():
     """
@@ -21,46 +83,160 @@ def get_connection():
         user=db_user,
         password=db_password,
         database=db_name,
-        cursorclass=pymysql.cursors.DictCursor,
+        cursorclass=TimedDictCursor,
         autocommit=False
     )
 
+class ConnectionPool:
+    """
+    A fixed-size pool of PyMySQL connections shared by the threads of one process.
+    Connections are opened lazily and health-checked on checkout.
+    """
+
+    def __init__(self, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._pid = os.getpid()
+
+    def _reset_after_fork(self):
+        # Sockets inherited from the parent process must never be shared with it.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle = queue.LifoQueue()
+
+    def acquire(self):
+        self._reset_after_fork()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No database connection available after {self.timeout}s")
+        try:
+            return self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkout(self):
+        now = time.time()
+        while True:
+            try:
+                connection, created_at, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                connection = get_connection()
+                connection._pool_created_at = time.time()
+                return connection
+            if now - created_at > DB_POOL_RECYCLE:
+                self._close_quietly(connection)
+                continue
+            if now - last_used > DB_POOL_PING_INTERVAL:
+                try:
+                    connection.ping(reconnect=True)
+                except pymysql.MySQLError:
+                    self._close_quietly(connection)
+                    continue
+            connection._pool_created_at = created_at
+            return connection
+
+    def release(self, connection, discard=False):
+        """
+        Returns a connection to the pool. Any uncommitted work is rolled back, matching the
+        behaviour of closing a connection without committing.
+        """
+        try:
+            if not discard:
+                try:
+                    connection.rollback()
+                except pymysql.MySQLError:
+                    discard = True
+            if discard:
+                self._close_quietly(connection)
+            else:
+                self._idle.put((connection, connection._pool_created_at, time.time()))
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+_pool = ConnectionPool()
+
+
+@contextmanager
+def borrow_connection():
+    """
+    Checks a connection out of the process-wide pool for the duration of a with block.
+    Callers commit explicitly; anything left uncommitted is rolled back on return.
+    """
+    connection = _pool.acquire()
+    try:
+        yield connection
+    except pymysql.err.OperationalError:
+        _release(connection, discard=True)
+        raise
+    except BaseException:
+        _release(connection)
+        raise
+    else:
+        _release(connection)
+
+def _release(connection, discard=False):
+    # Reps inserted on this connection are committed or rolled back by now, so the shared cache may reload.
+    inserted_reps = getattr(connection, "_inserted_reps", False)
+    connection._inserted_reps = False
+    _pool.release(connection, discard)
+    if inserted_reps:
+        reference_cache.invalidate()
+
+def ensure_reference_cache(connection):
+    """
+    Loads the shared reference cache through the connection when it is stale, unless the connection
+    has inserted reps in its still-open transaction: they could yet be rolled back, so the cache keeps
+    its current state until the connection is released.
+    """
+    if not getattr(connection, "_inserted_reps", False):
+        reference_cache.ensure_loaded(connection)
+
+# Looked up per call, so a replaced get_connection (benchmarks/local_db.py) is picked up.
+id_allocator = IdAllocator(lambda: get_connection())
+
 def get_sales_rep_id(rep_name, connection):
     """
-    Finds the ID for a sales rep by name.
-    If the rep does not exist, it creates a new one.
+    Finds the ID for a sales rep by name, resolving from the reference cache when possible.
+    If the rep does not exist, it creates a new one in the caller's transaction; the cache picks it up
+    after the connection is released.
     """
+    ensure_reference_cache(connection)
+    cached_id = reference_cache.rep_id(rep_name)
+    if cached_id:
+        return cached_id
+
     with connection.cursor() as cursor:
         cursor.execute("SELECT Sales_Rep_ID FROM sales_rep WHERE Rep_Name = %s", (rep_name,))
         result = cursor.fetchone()
         if result:
             return result["Sales_Rep_ID"]
 
-        cursor.execute("SELECT Sales_Rep_ID FROM sales_rep ORDER BY Sales_Rep_ID DESC LIMIT 1")
-        last = cursor.fetchone()
-        if last and last["Sales_Rep_ID"].startswith("SR"):
-            new_num = int(last["Sales_Rep_ID"][2:]) + 1
-        else:
-            new_num = 1
-        new_id = f"SR{str(new_num).zfill(3)}"
-
+        new_id = id_allocator.next_id("sales_rep")
         cursor.execute("INSERT INTO sales_rep (Sales_Rep_ID, Rep_Name) VALUES (%s, %s)", (new_id, rep_name))
+        connection._inserted_reps = True
         return new_id
 
 def get_product_id(product_name, connection):
     """
-    Finds the ID for a product by its exact name. Returns None if not found.
+    Finds the ID for a product by its name (case-insensitive) from the reference cache.
+    Returns None if not found.
     """
     if not product_name:
         return None
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT Product_ID FROM product WHERE LOWER(Product_Name) = %s", (product_name.lower(),))
-        result = cursor.fetchone()
-        if result:
-            return result["Product_ID"]
-        else:
-            return None
+    ensure_reference_cache(connection)
+    return reference_cache.product_id(product_name)
 
+@timed("crm_match_seconds", function="fuzzy_match_product")
 def fuzzy_match_product(product_name_partial, connection, threshold=50):
     """
     Finds the best product match using fuzzy string matching.
@@ -84,6 +260,7 @@ def fuzzy_match_product(product_name_partial, connection, threshold=50):
     else:
         return None
 
+@timed("crm_match_seconds", function="match_clinic")
 def match_clinic(clinic_name_partial, connection):
     """
     Performs a simple search for a clinic using SQL LIKE.
@@ -102,38 +279,58 @@ def match_clinic(clinic_name_partial, connection):
         print(f"Error during exact clinic match: {e}")
         return None
 
+@timed("crm_match_seconds", function="fuzzy_match_clinic")
 def fuzzy_match_clinic(clinic_name_partial, connection, threshold=75):
     """
-    Finds the best clinic match using fuzzy string matching.
+    Finds the best clinic match using fuzzy string matching against the in-memory clinic index.
+    The index is (re)loaded through the given connection when it is missing or stale.
     """
     try:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT Clinic_ID, Clinic_Name FROM clinic")
-            all_clinics = cursor.fetchall()
-
-        best_match = None
-        best_score = 0
-
-        for clinic in all_clinics:
-            score = fuzz.partial_ratio(clinic_name_partial.lower(), clinic["Clinic_Name"].lower())
-            if score > best_score:
-                best_score = score
-                best_match = clinic
-
-        if best_score >= threshold:
-            best_match["match_score"] = best_score
-            return best_match
-        else:
-            return None
+        clinic_index.ensure_loaded(connection)
+        return clinic_index.best_match(clinic_name_partial, threshold)
     except Exception as e:
         print(f"Fuzzy match failed for clinic: {e}")
         return None
 
+INTERACTION_COLUMNS = (
+    "Clinic_ID", "Contact_Name", "Sales_Rep_ID", "Product_ID", "Samples_Given", "Follow_Up", "Status",
+    "Interaction_Date", "Additional_Notes", "CRM_Created_Date", "Lead_Source", "Last_Contacted"
+)
+# The unique key on (Clinic_ID, Sales_Rep_ID, Product_ID, Interaction_Day) (migration 0002) turns a repeat
+# of an existing interaction into a no-op update, which reports 0 affected rows.
+UPSERT_INTERACTION_SQL = (
+    f"INSERT INTO crm_interaction ({', '.join(INTERACTION_COLUMNS)}) "
+    f"VALUES ({', '.join(['%s'] * len(INTERACTION_COLUMNS))}) "
+    f"ON DUPLICATE KEY UPDATE Clinic_ID = Clinic_ID"
+)
+_interaction_key_checked = False
+
+def require_interaction_key(connection):
+    """
+    Duplicate interactions are only caught by the uq_crm_interaction_day key, so nothing is written until
+    migration 0002 has added it; without it every upsert would silently insert. Checked once per process.
+    """
+    global _interaction_key_checked
+    if _interaction_key_checked:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT COUNT(*) AS found
+            FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = 'crm_interaction'
+              AND index_name = 'uq_crm_interaction_day'
+        """)
+        if not cursor.fetchone()["found"]:
+            raise RuntimeError("crm_interaction has no uq_crm_interaction_day key; run migrate.py")
+    _interaction_key_checked = True
+
 def insert_interaction(clinic_id, extracted, connection):
     """
-    Inserts a new CRM interaction record into the database.
+    Inserts a new CRM interaction record into the database, unless the clinic already has one for the
+    same rep, product and day.
     """
     try:
+        require_interaction_key(connection)
         with connection.cursor() as cursor:
             sales_rep_id = get_sales_rep_id(extracted.get("Rep_Name", ""), connection)
             product_id = get_product_id(extracted.get("Product_Interest", ""), connection)
@@ -155,25 +352,7 @@ def insert_interaction(clinic_id, extracted, connection):
                 row = cursor.fetchone()
                 contact_name = row["Contact_Name"] if row else ""
 
-            cursor.execute("""
-                SELECT COUNT(*) as cnt FROM crm_interaction
-                WHERE Clinic_ID = %s AND Sales_Rep_ID = %s AND Product_ID = %s AND DATE(Interaction_Date) = %s
-            """, (clinic_id, sales_rep_id, product_id, interaction_date))
-
-            if cursor.fetchone()["cnt"] > 0:
-                print(f"Skipping duplicate interaction for clinic: {clinic_id}")
-                return interaction_date, crm_created_date
-
-            sql = """
-                INSERT INTO crm_interaction (
-                    Clinic_ID, Contact_Name, Sales_Rep_ID,
-                    Product_ID, Samples_Given, Follow_Up,
-                    Status, Interaction_Date, Additional_Notes,
-                    CRM_Created_Date, Lead_Source, Last_Contacted
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            cursor.execute(sql, (
+            inserted = cursor.execute(UPSERT_INTERACTION_SQL, (
                 clinic_id,
                 contact_name,
                 sales_rep_id,
@@ -188,10 +367,155 @@ def insert_interaction(clinic_id, extracted, connection):
                 last_contacted
             ))
 
-        print(f"Insert Successful for clinic: {clinic_id}")
+        print(f"Insert Successful for clinic: {clinic_id}" if inserted
+              else f"Skipping duplicate interaction for clinic: {clinic_id}")
         return interaction_date, crm_created_date
 
     except Exception as e:
         print(f"Error during interaction insertion: {e}")
         connection.rollback()
-        return None, None
\ No newline at end of file
+        return None, None
+
+def insert_clinics_bulk(clinics, connection):
+    """
+    Inserts many clinic rows with one multi-row INSERT. Each clinic is a dict keyed by column name.
+    The caller commits.
+    """
+    if not clinics:
+        return
+    columns = ("Clinic_ID", "Clinic_Name", "Clinic_Type", "Industry", "Clinic_Address", "Region",
+               "Parent_Company", "Contact_Name")
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO clinic ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+            [tuple(clinic.get(column) for column in columns) for clinic in clinics])
+
+def insert_interactions_bulk(records, connection, require_product=True):
+    """
+    Inserts many CRM interactions in a handful of queries: rep and product IDs are resolved up front and
+    all rows go in one multi-row upsert, where rows repeating an existing interaction (same clinic, rep,
+    product and day) are no-ops. The affected-row count only says how many rows were new, so a batch that
+    turns out partly duplicate is rolled back to a savepoint and replayed one upsert per row.
+
+    records is a list of (clinic_id, extracted) pairs. Returns one dict per record, in order, with
+    "status" ("inserted", "duplicate" or "failed"), "interaction_date", "crm_created_date", "error" and
+    "duplicate_of", the index of the earlier record a within-batch repeat duplicates. The caller commits;
+    if the INSERT itself fails the transaction is rolled back and every result has "rolled_back" set.
+    """
+    crm_created_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    results = [{"status": "failed", "interaction_date": None, "crm_created_date": None, "error": None,
+                "duplicate_of": None, "rolled_back": False} for _ in records]
+    try:
+        require_interaction_key(connection)
+        ensure_reference_cache(connection)
+        rep_ids = {}
+        for _, extracted in records:
+            rep_name = extracted.get("Rep_Name", "")
+            if rep_name not in rep_ids:
+                rep_ids[rep_name] = get_sales_rep_id(rep_name, connection)
+
+        missing_contacts = sorted({clinic_id for clinic_id, extracted in records
+                                   if not (extracted.get("Contact_Name") or "").strip()})
+        clinic_contacts = {}
+        if missing_contacts:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT Clinic_ID, Contact_Name FROM clinic WHERE Clinic_ID IN ({', '.join(['%s'] * len(missing_contacts))})",
+                    missing_contacts)
+                clinic_contacts = {row["Clinic_ID"]: row["Contact_Name"] for row in cursor.fetchall()}
+
+        candidates = []
+        for index, (clinic_id, extracted) in enumerate(records):
+            product_id = get_product_id(extracted.get("Product_Interest", ""), connection)
+            if require_product and not product_id:
+                results[index]["error"] = f"Product not found: {extracted.get('Product_Interest', '')}"
+                continue
+            interaction_date = extracted.get("Interaction_Date") or crm_created_date.split(" ")[0]
+            contact_name = (extracted.get("Contact_Name") or "").strip() or clinic_contacts.get(clinic_id) or ""
+            row = (clinic_id, contact_name, rep_ids[extracted.get("Rep_Name", "")], product_id,
+                   extracted.get("Samples_Given", ""), extracted.get("Follow_Up", ""), extracted.get("Status", ""),
+                   interaction_date, extracted.get("Additional_Notes", ""), crm_created_date,
+                   extracted.get("Lead_Source", ""), extracted.get("Last_Contacted") or interaction_date)
+            results[index].update({"interaction_date": interaction_date, "crm_created_date": crm_created_date})
+            candidates.append((index, row))
+
+        # Repeats within the batch are left out; NULL products never collide, as in the unique key.
+        first_index, new_rows = {}, []
+        for index, row in candidates:
+            key = (row[0], row[2], row[3], str(row[7])[:10])
+            if row[3] is not None and key in first_index:
+                results[index].update({"status": "duplicate", "duplicate_of": first_index[key]})
+                continue
+            first_index[key] = index
+            new_rows.append((index, row))
+
+        written = []
+        if new_rows:
+            with connection.cursor() as cursor:
+                cursor.execute("SAVEPOINT bulk_interactions")
+                cursor.executemany(UPSERT_INTERACTION_SQL, [row for _, row in new_rows])
+                inserted = cursor.rowcount
+                if 0 < inserted < len(new_rows):
+                    cursor.execute("ROLLBACK TO SAVEPOINT bulk_interactions")
+                    written = [cursor.execute(UPSERT_INTERACTION_SQL, row) > 0 for _, row in new_rows]
+                else:
+                    written = [inserted > 0] * len(new_rows)
+        for (index, _), written_here in zip(new_rows, written):
+            results[index]["status"] = "inserted" if written_here else "duplicate"
+        inserted_count = sum(result["status"] == "inserted" for result in results)
+        print(f"Bulk insert: {inserted_count} inserted, {len(candidates) - inserted_count} duplicates, "
+              f"{len(records) - len(candidates)} failed")
+        return results
+
+    except Exception as e:
+        print(f"Error during bulk interaction insertion: {e}")
+        connection.rollback()
+        for result in results:
+            result.update({"status": "failed", "error": result["error"] or str(e), "rolled_back": True})
+        return results
+
+def stream_interactions(start_date=None, end_date=None, rep_name=None, region=None, status=None, batch_size=500):
+    """
+    Yields CRM interactions joined to clinic, rep and product names, oldest first, through an
+    unbuffered server-side cursor so memory stays flat however many rows match.
+    Uses its own connection: abandoning the generator closes it instead of draining the result set.
+    """
+    conditions, params = [], []
+    if start_date:
+        conditions.append("ci.Interaction_Date >= %s")
+        params.append(start_date)
+    if end_date:
+        conditions.append("ci.Interaction_Date < DATE_ADD(%s, INTERVAL 1 DAY)")
+        params.append(end_date)
+    if rep_name:
+        conditions.append("sr.Rep_Name = %s")
+        params.append(rep_name)
+    if region:
+        conditions.append("c.Region = %s")
+        params.append(region)
+    if status:
+        conditions.append("ci.Status = %s")
+        params.append(status)
+    sql = f"""
+        SELECT ci.Clinic_ID, c.Clinic_Name, c.Region, ci.Contact_Name, sr.Rep_Name,
+               p.Product_Name AS Product_Interest, ci.Samples_Given, ci.Follow_Up, ci.Status,
+               ci.Interaction_Date, ci.Lead_Source, ci.Last_Contacted, ci.Additional_Notes, ci.CRM_Created_Date
+        FROM crm_interaction ci
+        LEFT JOIN clinic c ON c.Clinic_ID = ci.Clinic_ID
+        LEFT JOIN sales_rep sr ON sr.Sales_Rep_ID = ci.Sales_Rep_ID
+        LEFT JOIN product p ON p.Product_ID = ci.Product_ID
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        ORDER BY ci.Interaction_Date
+    """
+    connection = get_connection()
+    try:
+        cursor = connection.cursor(TimedSSDictCursor)
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+        cursor.close()
+    finally:
+        connection.close()
@@ -0,0 +1,59 @@
+import csv
+import io
+import zipfile
+
+# Rows are flushed to the response every FLUSH_ROWS rows, so only one chunk is ever held in memory.
+FLUSH_ROWS = 500
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """
+    Write-only, non-seekable sink that collects bytes until the response generator takes them.
+    zipfile falls back to streaming mode (data descriptors) for sinks like this.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_csv(rows, fieldnames):
+    """
+    Yields a CSV document (header first) in byte chunks.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+    writer.writeheader()
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % FLUSH_ROWS == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def stream_zip(rows, fieldnames, csv_name):
+    """
+    Yields a ZIP archive holding one deflated CSV, compressing rows as they arrive.
+    """
+    sink = _ChunkBuffer()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(csv_name, "w", force_zip64=True) as member:
+            for chunk in stream_csv(rows, fieldnames):
+                member.write(chunk)
+                data = sink.take()
+                if data:
+                    yield data
+    yield sink.take()
@@ -0,0 +1,244 @@
+"""
+Keyword rules for the fields extract_fields fills without NER, compiled from extraction_rules.json
+into one Aho-Corasick automaton so every note is lowered and scanned exactly once.
+
+* samples_given / follow_up: the last sentence mentioning one of the keywords decides the field;
+  "No" if that sentence also contains a negation (as a whole word), otherwise "Yes".
+* status / lead_source: the first rule, in file order, with any phrase anywhere in the note.
+* clinic_negation: the first keyword, in file order, found anywhere; its first position splits
+  the ORG entities a rep corrected themselves on ("not Happy Paws, it's Sunshine").
+* clinic_prefixes: stripped from the start of extracted clinic names, first match in file order.
+
+Matching is plain substring matching on the lower-cased note, except negations, which must stand
+alone as words. Editing the file takes effect on the next call after the mtime check interval.
+"""
+import bisect
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+EXTRACTION_RULES_PATH = os.environ.get('EXTRACTION_RULES_PATH',
+                                       os.path.join(os.path.dirname(os.path.abspath(__file__)), 'extraction_rules.json'))
+EXTRACTION_RULES_CHECK_INTERVAL = float(os.environ.get('EXTRACTION_RULES_CHECK_INTERVAL', 5))
+
+_SEPARATOR = re.compile(r"[.!?\n]")  # sentence boundaries, as the original re.split used
+UNKNOWN = "Unknown"
+
+
+class AhoCorasick:
+    """
+    Multi-pattern substring matcher: finditer reports every occurrence of every pattern, overlapping
+    ones included, in a single left-to-right pass over the text.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._goto, self._fail, self._out = [{}], [0], [[]]
+        for index, pattern in enumerate(self.patterns):
+            if not pattern:
+                raise ValueError("Patterns must not be empty")
+            node = 0
+            for char in pattern:
+                if char not in self._goto[node]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][char] = len(self._goto) - 1
+                node = self._goto[node][char]
+            self._out[node].append(index)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0) if node else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+        # Fold the failure links into the transition tables (visiting nodes breadth-first, so each fail
+        # target is complete first): the scan loop then takes exactly one dict lookup per character.
+        self._delta = [dict(self._goto[0])]
+        queue = deque(self._goto[0].values())
+        order = []
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            queue.extend(self._goto[node].values())
+        self._delta += [None] * len(order)
+        for node in order:
+            self._delta[node] = {**self._delta[self._fail[node]], **self._goto[node]}
+
+    def finditer(self, text):
+        """
+        Yields (start, end, pattern_index) for every match, ordered by end position.
+        """
+        delta, out, patterns = self._delta, self._out, self.patterns
+        node = 0
+        for position, char in enumerate(text):
+            node = delta[node].get(char, 0)
+            if out[node]:
+                for index in out[node]:
+                    yield position + 1 - len(patterns[index]), position + 1, index
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+
+class CompiledRules:
+    """
+    One rules file compiled into a single automaton. Each distinct phrase is one pattern, tagged
+    with every (group, rule position) it belongs to.
+    """
+
+    def __init__(self, config):
+        self.fingerprint = hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        self.prefixes = tuple(prefix.lower() + " " for prefix in config.get("clinic_prefixes", []))
+        self.status = [(rule["label"], rule["phrases"]) for rule in config.get("status", [])]
+        self.lead_source = [(rule["label"], rule["phrases"]) for rule in config.get("lead_source", [])]
+        groups = {"samples_given": [[phrase] for phrase in config.get("samples_given", [])],
+                  "follow_up": [[phrase] for phrase in config.get("follow_up", [])],
+                  "negation": [[phrase] for phrase in config.get("negation", [])],
+                  "status": [phrases for _, phrases in self.status],
+                  "lead_source": [phrases for _, phrases in self.lead_source],
+                  "clinic_negation": [[phrase] for phrase in config.get("clinic_negation", [])]}
+        pattern_ids, self.tags = {}, []
+        for group, rules in groups.items():
+            for rank, phrases in enumerate(rules):
+                for phrase in phrases:
+                    phrase = phrase.lower()
+                    if phrase not in pattern_ids:
+                        pattern_ids[phrase] = len(self.tags)
+                        self.tags.append([])
+                    self.tags[pattern_ids[phrase]].append((group, rank))
+        self.matcher = AhoCorasick(pattern_ids)
+
+    def scan(self, note):
+        """
+        Returns the keyword-derived fields of one note plus the position of its clinic negation
+        keyword (-1 when there is none).
+        """
+        text = (note or "").lower()
+        separators = [match.start() for match in _SEPARATOR.finditer(text)]
+        samples_sentence = follow_up_sentence = -1
+        negated_sentences = set()
+        first_rank = {"status": None, "lead_source": None, "clinic_negation": None}
+        clinic_negation_index = -1
+        for start, end, index in self.matcher.finditer(text):
+            sentence = bisect.bisect_left(separators, start)
+            within_sentence = sentence == len(separators) or separators[sentence] >= end
+            for group, rank in self.tags[index]:
+                if group in first_rank:
+                    best = first_rank[group]
+                    if best is None or rank < best:
+                        first_rank[group] = rank
+                        # Matches arrive ordered by end, so a pattern's first match is also its leftmost one.
+                        if group == "clinic_negation": clinic_negation_index = start
+                elif not within_sentence:
+                    continue
+                elif group == "samples_given":
+                    samples_sentence = max(samples_sentence, sentence)
+                elif group == "follow_up":
+                    follow_up_sentence = max(follow_up_sentence, sentence)
+                elif ((start == 0 or not _is_word_char(text[start - 1]))
+                      and (end == len(text) or not _is_word_char(text[end]))):
+                    negated_sentences.add(sentence)
+        return {"Samples_Given": self._sentence_answer(samples_sentence, negated_sentences),
+                "Follow_Up": self._sentence_answer(follow_up_sentence, negated_sentences),
+                "Status": self._label(self.status, first_rank["status"]),
+                "Lead_Source": self._label(self.lead_source, first_rank["lead_source"]),
+                "clinic_negation_index": clinic_negation_index}
+
+    @staticmethod
+    def _sentence_answer(sentence, negated_sentences):
+        if sentence < 0:
+            return UNKNOWN
+        return "No" if sentence in negated_sentences else "Yes"
+
+    @staticmethod
+    def _label(rules, rank):
+        return UNKNOWN if rank is None else rules[rank][0]
+
+    def strip_prefix(self, name):
+        name = name.strip().lower()
+        for prefix in self.prefixes:
+            if name.startswith(prefix):
+                return name[len(prefix):]
+        return name
+
+
+class RuleSet:
+    """
+    Holds the compiled rules and recompiles them when the rules file's mtime changes. A broken edit
+    is reported and the previous rules stay in force.
+    """
+
+    def __init__(self, path=EXTRACTION_RULES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._compiled = None
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def _load(self):
+        mtime = None
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if mtime == self._mtime:
+                return
+            with open(self.path, encoding="utf-8") as f:
+                compiled = CompiledRules(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            if self._compiled is None:
+                raise
+            print(f"Keeping previous extraction rules; {self.path} is unreadable: {e}")
+            self._mtime = mtime  # report each broken version once
+            return
+        self._compiled = compiled
+        self._mtime = mtime
+        print(f"Loaded extraction rules from {self.path}")
+
+    def current(self):
+        if self._compiled is None or time.time() - self._checked_at > EXTRACTION_RULES_CHECK_INTERVAL:
+            with self._lock:
+                if self._compiled is None or time.time() - self._checked_at > EXTRACTION_RULES_CHECK_INTERVAL:
+                    self._load()
+                    self._checked_at = time.time()
+        return self._compiled
+
+    def reload(self):
+        with self._lock:
+            self._mtime = None
+            self._load()
+            self._checked_at = time.time()
+
+
+rules = RuleSet()
+
+
+def scan_note(note):
+    return rules.current().scan(note)
+
+
+def scan_notes(notes):
+    """
+    Scans a batch of notes against one snapshot of the rules.
+    """
+    compiled = rules.current()
+    return [compiled.scan(note) for note in notes]
+
+
+def rules_fingerprint():
+    """
+    Identifies the rules currently in force, so cached extractions are not reused across rule edits.
+    """
+    return rules.current().fingerprint
+
+
+def strip_clinic_prefix(name):
+    return rules.current().strip_prefix(name)
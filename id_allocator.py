@@ -0,0 +1,88 @@
+import os
+import threading
+
+# Number of IDs a worker reserves from id_sequence per round trip. Unused IDs in a block are skipped
+# when the worker restarts, so IDs stay unique and increasing but may have gaps.
+ID_BLOCK_SIZE = int(os.environ.get('ID_BLOCK_SIZE', 20))
+
+# Sequence name -> (prefix, zero-padded width), matching the existing C001 / SR001 formats.
+ID_FORMATS = {"clinic": ("C", 3), "sales_rep": ("SR", 3)}
+
+
+class IdAllocator:
+    """
+    Hands out formatted IDs from blocks reserved atomically in the id_sequence table
+    (see migrations/0001_id_sequence.sql). connect opens a new database connection.
+
+    Reservations go through a dedicated connection of their own, outside the pool: callers usually
+    already hold a pooled connection with an open transaction, and the bump must commit on its own.
+    """
+
+    def __init__(self, connect, block_size=ID_BLOCK_SIZE):
+        self._connect = connect
+        self.block_size = block_size
+        self._blocks = {}  # sequence name -> [next value, end value (exclusive)]
+        self._lock = threading.Lock()
+        self._reserve_lock = threading.Lock()
+        self._connection = None
+        self._pid = os.getpid()
+
+    def _reservation_connection(self):
+        # A connection inherited from a parent process must not be shared with it.
+        if self._connection is None or self._pid != os.getpid():
+            self._connection, self._pid = self._connect(), os.getpid()
+        else:
+            self._connection.ping(reconnect=True)
+        return self._connection
+
+    def _reserve(self, sequence, size):
+        """
+        Bumps the counter by size in one statement and returns the reserved [start, end) range.
+        LAST_INSERT_ID(expr) makes the new value readable on this connection without a lock.
+        The bump is committed at once, independent of the caller's transaction.
+        """
+        with self._reserve_lock:
+            connection = self._reservation_connection()
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "UPDATE id_sequence SET Next_Value = LAST_INSERT_ID(Next_Value + %s) WHERE Sequence_Name = %s",
+                        (size, sequence))
+                    if cursor.rowcount != 1:
+                        raise RuntimeError(f"id_sequence has no '{sequence}' row; run migrate.py")
+                    cursor.execute("SELECT LAST_INSERT_ID() AS end_value")
+                    end = int(cursor.fetchone()["end_value"])
+                connection.commit()
+            except Exception:
+                self._connection = None
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+                raise
+        return end - size, end
+
+    def allocate(self, sequence, count):
+        """
+        Returns count new IDs for the sequence, reserving more blocks as needed. The block lock is not
+        held during a reservation; a thread that reserves takes what it needs from its new block and
+        keeps the rest for others if the shared block has run out meanwhile, otherwise the rest is skipped.
+        """
+        prefix, width = ID_FORMATS[sequence]
+        with self._lock:
+            block = self._blocks.setdefault(sequence, [0, 0])
+            take = min(count, block[1] - block[0])
+            values = list(range(block[0], block[0] + take))
+            block[0] += take
+        if len(values) < count:
+            start, end = self._reserve(sequence, max(self.block_size, count - len(values)))
+            take = count - len(values)
+            values.extend(range(start, start + take))
+            with self._lock:
+                block = self._blocks[sequence]
+                if block[0] >= block[1]:
+                    block[0], block[1] = start + take, end
+        return [f"{prefix}{str(value).zfill(width)}" for value in values]
+
+    def next_id(self, sequence):
+        return self.allocate(sequence, 1)[0]
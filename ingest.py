@@ -0,0 +1,304 @@
+"""
+Backfills archived call recordings without the web form: every recording in a directory (searched
+recursively) or ZIP archive is transcribed, its fields extracted and its clinic matched exactly as
+for an upload, and the interactions are inserted in batches.
+
+Recordings are transcribed on --workers threads; their transcripts are then extracted --batch-size at a
+time with one batched NER call (extract_fields_batch), matched and inserted. Each interaction is dated by
+its recording's modification time (a ZIP member's stored time), so past visits stay distinct under the
+one-interaction-per-day key; --date-today dates them all today instead, as an upload would.
+
+Recordings whose clinic only matches fuzzily below --accept-score, matches no clinic, or cannot be
+inserted (e.g. unknown product) are written to the review CSV instead of stopping the run.
+Finished recordings are appended to the checkpoint file after their batch commits, so re-running
+the same command resumes where an interrupted run stopped.
+
+Usage:
+    python ingest.py recordings/ [--checkpoint ingest_checkpoint.jsonl] [--review-csv ingest_review.csv]
+                     [--batch-size 50] [--workers 8] [--accept-score 90] [--date-today]
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from app import ALLOWED_EXTENSIONS, clean_clinic_name, extract_fields, extract_fields_batch
+from db_utils import borrow_connection, fuzzy_match_clinic, insert_interactions_bulk, match_clinic
+from transcription import TRANSCRIBE_WORKERS, transcribe_file
+
+REVIEW_FIELDS = ["source", "reason", "Clinic_Name", "suggested_clinic_id", "suggested_clinic_name", "match_score",
+                 "Rep_Name", "Contact_Name", "Product_Interest", "Samples_Given", "Follow_Up", "Status", "Lead_Source",
+                 "Interaction_Date", "transcription"]
+
+
+def is_recording(name):
+    return '.' in name and name.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def list_recordings(path):
+    """
+    Returns (source, modified) pairs: paths relative to a directory, or member names of a ZIP.
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            return [(info.filename, datetime(*info.date_time)) for info in archive.infolist()
+                    if not info.is_dir() and is_recording(info.filename)]
+    recordings = []
+    for root, _, names in os.walk(path):
+        for name in names:
+            if is_recording(name):
+                full_path = os.path.join(root, name)
+                recordings.append((os.path.relpath(full_path, path),
+                                   datetime.fromtimestamp(os.path.getmtime(full_path))))
+    return sorted(recordings)
+
+
+def load_checkpoint(path):
+    """
+    Returns the sources already finished by earlier runs. A line cut short by a crash is ignored.
+    """
+    finished = set()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    finished.add(json.loads(line)["source"])
+                except (ValueError, KeyError):
+                    continue
+    return finished
+
+
+class Ingest:
+    def __init__(self, args):
+        self.args = args
+        self.is_zip = zipfile.is_zipfile(args.path)
+        self.scratch = tempfile.mkdtemp(prefix="ingest-") if self.is_zip else None
+        self._zip_lock = threading.Lock()
+        self._archive = zipfile.ZipFile(args.path) if self.is_zip else None
+        self.transcribed = []  # (source, modified, transcription) waiting for the next batched extraction
+        self.pending = []  # (source, clinic_id, extracted) waiting for the next batch insert
+        self.counts = {"inserted": 0, "duplicate": 0, "review": 0, "failed": 0}
+        self.stage_seconds = {"transcribe": 0.0, "extract": 0.0, "match": 0.0, "insert": 0.0}
+        self._stats_lock = threading.Lock()
+        self._checkpoint = open(args.checkpoint, "a", encoding="utf-8")
+        review_exists = os.path.exists(args.review_csv) and os.path.getsize(args.review_csv) > 0
+        self._review_file = open(args.review_csv, "a", newline="", encoding="utf-8")
+        self._review = csv.DictWriter(self._review_file, fieldnames=REVIEW_FIELDS, extrasaction="ignore")
+        if not review_exists:
+            self._review.writeheader()
+
+    def close(self):
+        self._checkpoint.close()
+        self._review_file.close()
+        if self._archive:
+            self._archive.close()
+        if self.scratch:
+            shutil.rmtree(self.scratch, ignore_errors=True)
+
+    def _timed(self, stage, started):
+        with self._stats_lock:
+            self.stage_seconds[stage] += time.perf_counter() - started
+
+    def _local_file(self, source):
+        if not self.is_zip:
+            return os.path.join(self.args.path, source), False
+        target = os.path.join(self.scratch, f"{threading.get_ident()}-{os.path.basename(source)}")
+        with self._zip_lock, self._archive.open(source) as member, open(target, "wb") as f:
+            shutil.copyfileobj(member, f)
+        return target, True
+
+    def transcribe(self, source, modified):
+        """
+        Transcribes one recording on a worker thread and returns (source, modified, transcription).
+        """
+        filepath, temporary = self._local_file(source)
+        try:
+            started = time.perf_counter()
+            transcription = transcribe_file(filepath)["text"]
+            self._timed("transcribe", started)
+        finally:
+            if temporary:
+                os.remove(filepath)
+        return source, modified, transcription
+
+    def match(self, extracted, connection):
+        """
+        Returns (clinic_id, review_reason) for an extracted record; review_reason is None when it is ready to insert.
+        """
+        clinic = match_clinic(extracted["Clinic_Name"], connection)
+        if clinic:
+            return clinic["Clinic_ID"], None
+        fuzzy = fuzzy_match_clinic(extracted["Clinic_Name"], connection)
+        if not fuzzy:
+            return None, "no_clinic_match"
+        extracted.update({"suggested_clinic_id": fuzzy["Clinic_ID"], "suggested_clinic_name": fuzzy["Clinic_Name"],
+                          "match_score": fuzzy["match_score"]})
+        if fuzzy["match_score"] < self.args.accept_score:
+            return None, "ambiguous_fuzzy_match"
+        return fuzzy["Clinic_ID"], None
+
+    def _extract(self, batch):
+        """
+        Extracts fields for a batch of transcripts with one batched NER call. If the batch fails, each
+        transcript is retried alone so one bad note does not cost the others; those that still fail are
+        left uncheckpointed and retried on the next run.
+        """
+        try:
+            return extract_fields_batch([transcription for _, _, transcription in batch])
+        except Exception as e:
+            print(f"Batched extraction failed ({e}); extracting one recording at a time")
+        extracted = []
+        for source, _, transcription in batch:
+            try:
+                extracted.append(extract_fields(transcription))
+            except Exception as e:
+                print(f"Failed {source}: {e}")
+                self.counts["failed"] += 1
+                extracted.append(None)
+        return extracted
+
+    def process_batch(self):
+        """
+        Extracts and matches the transcribed recordings, sends them to review or the insert batch, then flushes.
+        """
+        batch, self.transcribed = self.transcribed, []
+        if batch:
+            started = time.perf_counter()
+            extracted_batch = self._extract(batch)
+            self._timed("extract", started)
+            started = time.perf_counter()
+            with borrow_connection() as connection:
+                for (source, modified, transcription), extracted in zip(batch, extracted_batch):
+                    if extracted is None:
+                        continue
+                    extracted.update({"transcription": transcription, "filename": os.path.basename(source),
+                                      "Clinic_Name": clean_clinic_name(extracted.get("Clinic_Name", ""))})
+                    if not self.args.date_today:
+                        extracted["Interaction_Date"] = modified.strftime("%Y-%m-%d %H:%M:%S")
+                    clinic_id, reason = self.match(extracted, connection)
+                    if reason:
+                        self.review(source, extracted, reason)
+                    else:
+                        self.pending.append((source, clinic_id, extracted))
+            self._timed("match", started)
+        self.flush()
+
+    def _finish(self, source, outcome):
+        self._checkpoint.write(json.dumps({"source": source, "outcome": outcome,
+                                           "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}) + "\n")
+        self.counts["review" if outcome.startswith("review") else outcome] += 1
+
+    def review(self, source, extracted, reason):
+        self._review.writerow(dict(extracted, source=source, reason=reason))
+        self._finish(source, f"review:{reason}")
+
+    def flush(self):
+        """
+        Inserts the pending records in one transaction, records them in the review CSV and checkpoint, and
+        syncs both files. If the database fails the whole batch (e.g. it is down), none of the batch is
+        checkpointed and the run stops, so the next run retries those recordings.
+        """
+        pending, self.pending = self.pending, []
+        try:
+            if not pending:
+                return
+            started = time.perf_counter()
+            with borrow_connection() as connection:
+                results = insert_interactions_bulk([(clinic_id, extracted) for _, clinic_id, extracted in pending],
+                                                   connection)
+                connection.commit()
+            self._timed("insert", started)
+            if results[0]["rolled_back"]:
+                raise RuntimeError(f"Batch insert failed ({results[0]['error']}); its {len(pending)} recording(s) "
+                                   f"were not checkpointed and will be retried on the next run")
+            for (source, _, extracted), result in zip(pending, results):
+                if result["status"] == "failed":
+                    self.review(source, extracted, result["error"] or "insert_failed")
+                else:
+                    self._finish(source, result["status"])
+        finally:
+            self._review_file.flush()
+            self._checkpoint.flush()
+            os.fsync(self._checkpoint.fileno())
+
+    def run(self):
+        recordings = list_recordings(self.args.path)
+        finished = load_checkpoint(self.args.checkpoint)
+        todo = [(source, modified) for source, modified in recordings if source not in finished]
+        print(f"{len(recordings)} recording(s) found, {len(recordings) - len(todo)} already ingested, "
+              f"{len(todo)} to go with {self.args.workers} worker(s)")
+        started = time.perf_counter()
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.args.workers, thread_name_prefix="ingest") as pool:
+            futures = {pool.submit(self.transcribe, source, modified): source for source, modified in todo}
+            try:
+                for future in as_completed(futures):
+                    done += 1
+                    try:
+                        self.transcribed.append(future.result())
+                    except Exception as e:
+                        # Not checkpointed, so the recording is retried on the next run.
+                        print(f"Failed {futures[future]}: {e}")
+                        self.counts["failed"] += 1
+                        continue
+                    if len(self.transcribed) >= self.args.batch_size:
+                        self.process_batch()
+                    if done % self.args.batch_size == 0:
+                        elapsed = time.perf_counter() - started
+                        print(f"{done}/{len(todo)} processed, {done / elapsed * 60:.1f} recordings/min")
+            except BaseException as e:
+                pool.shutdown(wait=False, cancel_futures=True)
+                # After any other error (e.g. the database went away) the last batch would only fail again and
+                # hide it; those recordings are not checkpointed and are retried on the next run.
+                if isinstance(e, KeyboardInterrupt):
+                    print("Interrupted; saving finished recordings before exiting...")
+                    self.process_batch()
+                raise
+            self.process_batch()
+        self.summary(done, time.perf_counter() - started)
+
+    def summary(self, done, elapsed):
+        print(f"\nProcessed {done} recording(s) in {elapsed:.1f}s "
+              f"({done / elapsed * 60 if elapsed else 0:.1f} recordings/min)")
+        print("  " + ", ".join(f"{outcome}: {count}" for outcome, count in self.counts.items()))
+        busy = sum(self.stage_seconds.values()) or 1.0
+        for stage, seconds in self.stage_seconds.items():
+            print(f"  {stage:<10} {seconds:8.1f}s total, {seconds / max(done, 1):6.2f}s per recording "
+                  f"({seconds / busy:.0%} of measured time)")
+        if self.counts["review"]:
+            print(f"{self.counts['review']} recording(s) need review in {self.args.review_csv}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="directory of recordings or a ZIP archive")
+    parser.add_argument("--checkpoint", default="ingest_checkpoint.jsonl")
+    parser.add_argument("--review-csv", default="ingest_review.csv")
+    parser.add_argument("--batch-size", type=int, default=50,
+                        help="recordings extracted together and inserted per transaction")
+    parser.add_argument("--workers", type=int, default=max(1, TRANSCRIBE_WORKERS),
+                        help="recordings in progress at once")
+    parser.add_argument("--accept-score", type=int, default=90,
+                        help="fuzzy clinic matches scoring below this go to the review CSV")
+    parser.add_argument("--date-today", action="store_true",
+                        help="date every interaction today instead of by its recording's modification time")
+    args = parser.parse_args()
+    if not os.path.exists(args.path):
+        parser.error(f"{args.path} does not exist")
+
+    ingest = Ingest(args)
+    try:
+        ingest.run()
+    finally:
+        ingest.close()
+
+
+if __name__ == '__main__':
+    main()
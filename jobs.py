@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Number of upload jobs processed at once, how many files of one job may be in progress together
+# (so one large upload cannot take every transcription slot), and how long finished jobs are kept for polling.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+JOB_FILE_CONCURRENCY = int(os.environ.get('JOB_FILE_CONCURRENCY', max(1, (os.cpu_count() or 1) // JOB_WORKERS)))
+JOB_TTL_SECONDS = int(os.environ.get('JOB_TTL_SECONDS', 3600))
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="upload-job")
+_jobs = {}
+_lock = threading.Lock()
+_changed = threading.Condition(_lock)
+
+
+def _purge_expired_jobs():
+    """
+    Drops finished jobs older than JOB_TTL_SECONDS. Caller must hold _lock.
+    """
+    cutoff = time.time() - JOB_TTL_SECONDS
+    expired = [job_id for job_id, job in _jobs.items() if job["finished_at"] and job["finished_at"] < cutoff]
+    for job_id in expired:
+        del _jobs[job_id]
+
+
+def create_job(filenames):
+    """
+    Registers a new job for the given filenames and returns its ID.
+    The job stays queued until start_job is called.
+    """
+    job_id = uuid.uuid4().hex
+    with _lock:
+        _purge_expired_jobs()
+        _jobs[job_id] = {
+            "job_id": job_id,
+            "status": "queued",
+            "created_at": time.time(),
+            "finished_at": None,
+            "version": 0,
+            "files": [{"filename": name, "status": "queued", "error": None} for name in filenames],
+            "results": [None] * len(filenames),
+        }
+    return job_id
+
+
+def start_job(job_id, items, process_job):
+    """
+    Queues the job on the background pool. process_job(job_id, items) runs on a worker thread
+    and reports per-file progress and results through set_file_status.
+    """
+    _executor.submit(_run_job, job_id, items, process_job)
+
+
+def set_file_status(job_id, index, status, result=None, error=None):
+    """
+    Updates one file's progress. Finished files ("done") carry their result, failed ones an error.
+    """
+    with _lock:
+        job = _jobs[job_id]
+        job["files"][index].update({"status": status, "error": error})
+        if result is not None:
+            job["results"][index] = result
+        job["version"] += 1
+        _changed.notify_all()
+
+
+def map_files(items, handle):
+    """
+    Calls handle(index, item) for every file of a job on up to JOB_FILE_CONCURRENCY threads and
+    returns once all of them have finished. Results are reported by index, so order is preserved.
+    """
+    if len(items) <= 1 or JOB_FILE_CONCURRENCY <= 1:
+        for index, item in enumerate(items):
+            handle(index, item)
+        return
+    with ThreadPoolExecutor(max_workers=min(JOB_FILE_CONCURRENCY, len(items)), thread_name_prefix="upload-file") as pool:
+        for future in [pool.submit(handle, index, item) for index, item in enumerate(items)]:
+            future.result()
+
+
+def _run_job(job_id, items, process_job):
+    with _lock:
+        _jobs[job_id]["status"] = "running"
+    try:
+        process_job(job_id, items)
+    except Exception as e:
+        print(f"Job {job_id} failed: {e}")
+    with _lock:
+        job = _jobs[job_id]
+        for f in job["files"]:
+            if f["status"] not in ("done", "failed"):
+                f.update({"status": "failed", "error": f["error"] or "Processing was interrupted"})
+        job["status"] = "failed" if all(f["status"] == "failed" for f in job["files"]) else "done"
+        job["finished_at"] = time.time()
+        job["version"] += 1
+        _changed.notify_all()
+
+
+def _snapshot(job):
+    files = [dict(f) for f in job["files"]]
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "version": job["version"],
+        "total": len(files),
+        "completed": sum(1 for f in files if f["status"] in ("done", "failed")),
+        "files": files,
+        "results": list(job["results"]),
+    }
+
+
+def get_job(job_id):
+    """
+    Returns a snapshot of the job's progress and results, or None if the job is unknown or expired.
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        return _snapshot(job) if job else None
+
+
+def wait_for_change(job_id, version, timeout):
+    """
+    Blocks until the job's version differs from the given one (or timeout seconds pass) and
+    returns a fresh snapshot, or None if the job is unknown or expired.
+    """
+    with _changed:
+        _changed.wait_for(lambda: job_id not in _jobs or _jobs[job_id]["version"] != version, timeout)
+        job = _jobs.get(job_id)
+        return _snapshot(job) if job else None
@@ -0,0 +1,147 @@
+"""
+In-process instrumentation for the hot paths: labelled counters and latency histograms, rendered in
+the Prometheus text format by the /metrics route.
+
+timer() and timed() record how long a block or function took; inc() counts cache hits, rows and the
+like. An observation costs a perf_counter pair, a bisect and a dict update under a lock, cheap enough
+to leave on under load (METRICS_ENABLED=0 turns it off). With METRICS_SERVER_TIMING=1 the timings
+taken on a request's own thread are also summed per request and returned in a Server-Timing header,
+which browser dev tools show as a breakdown of the request.
+
+Every process keeps its own registry: with several gunicorn workers each scrape reports the worker
+that served it, and work done in transcription worker processes is only seen from the web process.
+"""
+import bisect
+import functools
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', '0') == '1'
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+                   60.0, 120.0)
+
+METRICS = {
+    "crm_http_request_seconds": ("histogram", "Time until the response headers, by endpoint, method and status."),
+    "crm_stage_seconds": ("histogram", "Time spent in each upload pipeline stage."),
+    "crm_model_call_seconds": ("histogram", "Speech and NER model calls made from this process."),
+    "crm_match_seconds": ("histogram", "Clinic, product and sales rep matching functions."),
+    "crm_db_query_seconds": ("histogram", "Database statements by statement type and table."),
+    "crm_db_rows_total": ("counter", "Rows returned or changed by database statements."),
+    "crm_clinic_index_rows_scanned_total": ("counter", "Clinic names scored by fuzzy clinic matching."),
+    "crm_cache_requests_total": ("counter", "Cache lookups by cache and result."),
+}
+
+_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [per-bucket counts with +Inf last, sum]
+_request = threading.local()
+_NOT_TOKEN = re.compile(r"[^A-Za-z0-9_-]")
+
+
+def inc(name, amount=1, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = (name, tuple(labels.items()))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, seconds, **labels):
+    """
+    Records one latency. Labels must always be passed in the same order for a given metric.
+    """
+    if not METRICS_ENABLED:
+        return
+    key = (name, tuple(labels.items()))
+    bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0]
+        histogram[0][bucket] += 1
+        histogram[1] += seconds
+    breakdown = getattr(_request, "breakdown", None)
+    if breakdown is not None:
+        part = "_".join(str(value) for value in labels.values()) or name
+        total, count = breakdown.get(part, (0.0, 0))
+        breakdown[part] = (total + seconds, count + 1)
+
+
+@contextmanager
+def timer(name, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def timed(name, **labels):
+    """
+    Decorator form of timer().
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - started, **labels)
+        return wrapper
+    return decorate
+
+
+def start_request():
+    _request.breakdown = {} if METRICS_ENABLED and METRICS_SERVER_TIMING else None
+
+
+def finish_request(total_seconds):
+    """
+    Ends the current thread's request breakdown and returns it as a Server-Timing header value,
+    or None when the header is disabled.
+    """
+    breakdown, _request.breakdown = getattr(_request, "breakdown", None), None
+    if breakdown is None:
+        return None
+    parts = [f'{_NOT_TOKEN.sub("_", part)};dur={seconds * 1000:.2f};desc="{count} call{"s" if count > 1 else ""}"'
+             for part, (seconds, count) in sorted(breakdown.items(), key=lambda item: -item[1][0])]
+    return ", ".join(parts + [f"total;dur={total_seconds * 1000:.2f}"])
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _series(name, labels, extra=()):
+    pairs = [f'{key}="{_escape(value)}"' for key, value in tuple(labels) + tuple(extra)]
+    return f"{name}{{{','.join(pairs)}}}" if pairs else name
+
+
+def render():
+    """
+    Returns every metric of this process in the Prometheus text exposition format.
+    """
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: (list(counts), total) for key, (counts, total) in _histograms.items()}
+    lines = []
+    for metric in sorted({name for name, _ in counters} | {name for name, _ in histograms}):
+        kind, help_text = METRICS.get(metric, ("untyped", ""))
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f"{_series(name, labels)} {value}")
+        for (name, labels), (counts, total) in sorted(histograms.items()):
+            if name != metric:
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{_series(name + '_bucket', labels, [('le', bound)])} {cumulative}")
+            lines += [f"{_series(name + '_sum', labels)} {total:.6f}", f"{_series(name + '_count', labels)} {cumulative}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,73 @@
+"""
+Applies the SQL files in migrations/ to the configured database, in file-name order.
+Applied versions are recorded in the schema_migrations table, so re-running is safe.
+
+Usage: python migrate.py [--list]
+"""
+import os
+import sys
+
+from db_utils import get_connection
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+
+def read_statements(path):
+    """
+    Splits a migration file into statements on semicolons that end a line, ignoring -- comments.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line for line in f.read().splitlines() if not line.strip().startswith("--")]
+    statements, current = [], []
+    for line in lines:
+        current.append(line)
+        if line.rstrip().endswith(";"):
+            statements.append("\n".join(current).rstrip().rstrip(";"))
+            current = []
+    if "\n".join(current).strip():
+        statements.append("\n".join(current))
+    return statements
+
+
+def pending_migrations(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                Version VARCHAR(255) NOT NULL PRIMARY KEY,
+                Applied_At DATETIME NOT NULL
+            )
+        """)
+        cursor.execute("SELECT Version FROM schema_migrations")
+        applied = {row["Version"] for row in cursor.fetchall()}
+    files = sorted(name for name in os.listdir(MIGRATIONS_DIR) if name.endswith(".sql"))
+    return [name for name in files if name[:-4] not in applied]
+
+
+def migrate():
+    connection = get_connection()
+    try:
+        pending = pending_migrations(connection)
+        if not pending:
+            print("Database schema is up to date.")
+        for name in pending:
+            print(f"Applying {name}...")
+            # MySQL commits DDL implicitly, so each statement is applied and recorded in order.
+            with connection.cursor() as cursor:
+                for statement in read_statements(os.path.join(MIGRATIONS_DIR, name)):
+                    cursor.execute(statement)
+                cursor.execute("INSERT INTO schema_migrations (Version, Applied_At) VALUES (%s, NOW())", (name[:-4],))
+            connection.commit()
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    if "--list" in sys.argv[1:]:
+        conn = get_connection()
+        try:
+            for migration in pending_migrations(conn):
+                print(migration)
+        finally:
+            conn.close()
+    else:
+        migrate()
@@ -0,0 +1,18 @@
+-- Counter table for id_allocator: one row per ID family holding the next unallocated number.
+-- Web workers reserve blocks of IDs from it instead of scanning clinic/sales_rep for the current maximum.
+CREATE TABLE IF NOT EXISTS id_sequence (
+    Sequence_Name VARCHAR(32) NOT NULL PRIMARY KEY,
+    Next_Value BIGINT UNSIGNED NOT NULL
+);
+
+-- Seed each counter past the highest existing numeric ID. This is the only scan of the ID columns;
+-- the numeric cast also fixes string ordering (SR1000 used to sort below SR999).
+INSERT IGNORE INTO id_sequence (Sequence_Name, Next_Value)
+SELECT 'clinic', COALESCE(MAX(CAST(SUBSTRING(Clinic_ID, 2) AS UNSIGNED)), 0) + 1
+FROM clinic
+WHERE Clinic_ID REGEXP '^C[0-9]+$';
+
+INSERT IGNORE INTO id_sequence (Sequence_Name, Next_Value)
+SELECT 'sales_rep', COALESCE(MAX(CAST(SUBSTRING(Sales_Rep_ID, 3) AS UNSIGNED)), 0) + 1
+FROM sales_rep
+WHERE Sales_Rep_ID REGEXP '^SR[0-9]+$';
@@ -0,0 +1,29 @@
+-- One interaction per clinic, sales rep, product and day, enforced by the database instead of a
+-- COUNT(*) ... WHERE DATE(Interaction_Date) = ? scan before every insert. Writes become
+-- INSERT ... ON DUPLICATE KEY UPDATE no-ops, which are race-free and use the unique key to find the
+-- existing row. Interaction_Day is a generated column so the key can cover the day.
+-- Rows without a product (new-clinic submissions) have a NULL Product_ID and are never considered equal.
+-- Apply before deploying code that relies on it: until the key exists the app refuses to write interactions.
+--
+-- Schema assumption: only the columns the application already writes (Clinic_ID, Sales_Rep_ID,
+-- Product_ID, Interaction_Date) are relied on; no particular primary key is assumed.
+--
+-- The unique key cannot be added while duplicates exist; remove them first. To list them:
+--   SELECT Clinic_ID, Sales_Rep_ID, Product_ID, DATE(Interaction_Date) AS Interaction_Day, COUNT(*) AS copies
+--   FROM crm_interaction
+--   GROUP BY Clinic_ID, Sales_Rep_ID, Product_ID, DATE(Interaction_Date)
+--   HAVING COUNT(*) > 1;
+-- To keep the earliest copy of each, delete the later ones by the table's primary key (shown as <pk>;
+-- check SHOW CREATE TABLE crm_interaction) once the list has been reviewed:
+--   DELETE newer FROM crm_interaction newer
+--   JOIN crm_interaction older
+--     ON older.Clinic_ID = newer.Clinic_ID AND older.Sales_Rep_ID = newer.Sales_Rep_ID
+--    AND older.Product_ID = newer.Product_ID AND DATE(older.Interaction_Date) = DATE(newer.Interaction_Date)
+--    AND (older.CRM_Created_Date, older.<pk>) < (newer.CRM_Created_Date, newer.<pk>);
+--
+-- A single ALTER either applies completely or not at all, so a failed run can simply be re-run after cleanup.
+-- The Interaction_Date index serves the export's date filters and ordering.
+ALTER TABLE crm_interaction
+    ADD COLUMN Interaction_Day DATE AS (DATE(Interaction_Date)) STORED,
+    ADD UNIQUE KEY uq_crm_interaction_day (Clinic_ID, Sales_Rep_ID, Product_ID, Interaction_Day),
+    ADD KEY idx_crm_interaction_date (Interaction_Date);
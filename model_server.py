@@ -0,0 +1,72 @@
+"""
+Local inference process holding the only copy of the Whisper and NER models on a node.
+
+Run `python model_server.py` with a secret MODEL_SERVER_AUTHKEY (optionally with MODEL_SERVER_ADDRESS
+to pick the socket path), then start the web workers as the same user with the same MODEL_SERVER_ADDRESS
+and MODEL_SERVER_AUTHKEY so models.transcribe / models.run_ner are forwarded here instead of loading the
+models in every worker. The socket is created 0600 in a directory only its owner can enter.
+"""
+import os
+import threading
+from multiprocessing.connection import Listener
+
+import models
+
+DEFAULT_ADDRESS = '/tmp/crm-model-server/model.sock'
+
+HANDLERS = {
+    "transcribe": models.transcribe_local,
+    "ner": models.run_ner_local,
+    "ping": lambda: "pong",
+}
+
+
+def handle_client(connection):
+    with connection:
+        while True:
+            try:
+                method, args, kwargs = connection.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                connection.send(("ok", HANDLERS[method](*args, **kwargs)))
+            except Exception as e:
+                print(f"Model server request '{method}' failed: {e}")
+                connection.send(("error", f"{type(e).__name__}: {e}"))
+
+
+def prepare_socket_dir(address):
+    """
+    Creates the socket's directory private to this user, and refuses one anyone else can enter or owns.
+    """
+    directory = os.path.dirname(os.path.abspath(address))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(f"{directory} must be owned by this user with mode 700 to hold the model server socket")
+
+
+def serve(address):
+    authkey = models.require_authkey()
+    prepare_socket_dir(address)
+    if os.path.exists(address):
+        os.remove(address)
+    models.preload()
+    umask = os.umask(0o177)  # the socket is created 0600
+    try:
+        listener = Listener(address, family='AF_UNIX', authkey=authkey)
+    finally:
+        os.umask(umask)
+    with listener:
+        print(f"Model server listening on {address}")
+        while True:
+            try:
+                connection = listener.accept()
+            except Exception as e:
+                print(f"Rejected model server connection: {e}")
+                continue
+            threading.Thread(target=handle_client, args=(connection,), daemon=True).start()
+
+
+if __name__ == '__main__':
+    serve(os.environ.get('MODEL_SERVER_ADDRESS', DEFAULT_ADDRESS))
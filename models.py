@@ -0,0 +1,141 @@
+"""
+Access to the speech-to-text and NER models.
+
+By default each process loads the models lazily on first use, so routes that never transcribe
+(e.g. /get_rep_list) start instantly. Two shared modes avoid one model copy per gunicorn worker:
+
+* MODEL_SERVER_ADDRESS=/path/to.sock sends every call to model_server.py listening on that socket.
+  Requests are pickled, so both sides must share a secret MODEL_SERVER_AUTHKEY; there is no default.
+* PRELOAD_MODELS=1 loads both models at import; run gunicorn with --preload so workers share them
+  copy-on-write after fork.
+"""
+import os
+import threading
+from multiprocessing.connection import Client
+
+import imageio_ffmpeg
+
+import ner_backends
+from metrics import timer
+import speech_backends
+
+WHISPER_MODEL_NAME = os.environ.get('WHISPER_MODEL', 'base')
+NER_MODEL_NAME = os.environ.get('NER_MODEL', 'dslim/bert-base-NER')
+# Identify everything that changes speech and NER output, for the transcription cache key.
+SPEECH_SETTINGS = {"backend": speech_backends.SPEECH_BACKEND, "model": WHISPER_MODEL_NAME,
+                   "compute_type": speech_backends.SPEECH_COMPUTE_TYPE
+                   if speech_backends.SPEECH_BACKEND != "whisper" else "float32"}
+NER_SETTINGS = {"backend": ner_backends.NER_BACKEND, "model": NER_MODEL_NAME}
+MODEL_SERVER_ADDRESS = os.environ.get('MODEL_SERVER_ADDRESS')
+MODEL_SERVER_AUTHKEY = os.environ.get('MODEL_SERVER_AUTHKEY', '').encode('utf-8')
+PRELOAD_MODELS = os.environ.get('PRELOAD_MODELS', '0') == '1'
+
+# Whisper installs per-call decoding hooks on the shared model and fast tokenizers refuse concurrent
+# use, so calls into each model are serialized within a process.
+speech_lock = threading.Lock()
+ner_lock = threading.Lock()
+_load_lock = threading.Lock()
+_speech_backend = None
+_ner_model = None
+_client = threading.local()
+
+# --- FFMPEG Initialization ---
+ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
+if os.path.dirname(ffmpeg_path) not in os.environ['PATH'].split(os.pathsep):
+    os.environ['PATH'] += os.pathsep + os.path.dirname(ffmpeg_path)
+
+
+def get_speech_backend():
+    global _speech_backend
+    if _speech_backend is None:
+        with _load_lock:
+            if _speech_backend is None:
+                _speech_backend = speech_backends.load_backend(speech_backends.SPEECH_BACKEND, WHISPER_MODEL_NAME)
+    return _speech_backend
+
+
+def get_ner_model():
+    global _ner_model
+    if _ner_model is None:
+        with _load_lock:
+            if _ner_model is None:
+                _ner_model = ner_backends.load_backend(ner_backends.NER_BACKEND, NER_MODEL_NAME)
+    return _ner_model
+
+
+def preload():
+    get_speech_backend()
+    get_ner_model()
+    print("Models loaded successfully.")
+
+
+def transcribe_local(audio, **options):
+    backend = get_speech_backend()
+    with speech_lock:
+        return backend.transcribe(audio, **options)
+
+
+def run_ner_local(texts, **options):
+    model = get_ner_model()
+    with ner_lock:
+        return model(texts, **options)
+
+
+def require_authkey():
+    """
+    Returns MODEL_SERVER_AUTHKEY, refusing to go on without one: the server unpickles every request, so
+    a guessable key would let any local user run code in the model server.
+    """
+    if not MODEL_SERVER_AUTHKEY:
+        raise RuntimeError("MODEL_SERVER_AUTHKEY must be set to the same secret for model_server.py and the "
+                           "web workers, e.g. MODEL_SERVER_AUTHKEY=$(openssl rand -hex 32)")
+    return MODEL_SERVER_AUTHKEY
+
+
+def _call_server(method, *args, **kwargs):
+    """
+    Sends one request to the model server over this thread's socket connection, reconnecting once
+    if the server was restarted since the last call.
+    """
+    for attempt in range(2):
+        connection = getattr(_client, "connection", None)
+        try:
+            if connection is None:
+                connection = _client.connection = Client(MODEL_SERVER_ADDRESS, family='AF_UNIX',
+                                                         authkey=require_authkey())
+            connection.send((method, args, kwargs))
+            status, payload = connection.recv()
+            break
+        except (EOFError, OSError):
+            _client.connection = None
+            if attempt:
+                raise
+    if status != "ok":
+        raise RuntimeError(f"Model server error in {method}: {payload}")
+    return payload
+
+
+def transcribe(audio, **options):
+    """
+    Transcribes an audio file path (or 16 kHz float32 array) and returns Whisper's result dict.
+    """
+    with timer("crm_model_call_seconds", model="speech", mode="server" if MODEL_SERVER_ADDRESS else "local"):
+        if MODEL_SERVER_ADDRESS:
+            return _call_server("transcribe", audio, **options)
+        return transcribe_local(audio, **options)
+
+
+def run_ner(texts, **options):
+    """
+    Runs the grouped-entity NER pipeline over one note (list of entities) or a list of notes.
+    """
+    with timer("crm_model_call_seconds", model="ner", mode="server" if MODEL_SERVER_ADDRESS else "local"):
+        if MODEL_SERVER_ADDRESS:
+            return _call_server("ner", texts, **options)
+        return run_ner_local(texts, **options)
+
+
+if MODEL_SERVER_ADDRESS:
+    require_authkey()
+elif PRELOAD_MODELS:
+    preload()
@@ -0,0 +1,66 @@
+"""
+NER engines producing the transformers grouped-entity format ({"entity_group", "word", "start",
+"end", "score"}) that extract_fields and extract_clinic_name_from_text rely on.
+
+* "transformers" (default): the PyTorch pipeline in full precision.
+* "onnx": the same model exported to ONNX and dynamically int8-quantized, run by ONNX Runtime
+  through the same pipeline post-processing. Needs `pip install optimum[onnxruntime]` and a one-off
+  export: `python ner_backends.py export`.
+"""
+import os
+import sys
+
+NER_BACKEND = os.environ.get('NER_BACKEND', 'transformers')
+NER_ONNX_DIR = os.environ.get('NER_ONNX_DIR', os.path.join('models_cache', 'ner-onnx-int8'))
+
+
+def load_transformers(model_name):
+    from transformers import pipeline
+    return pipeline("ner", model=model_name, grouped_entities=True)
+
+
+def load_onnx(model_name):
+    try:
+        from optimum.onnxruntime import ORTModelForTokenClassification
+        from transformers import AutoTokenizer, pipeline
+    except ImportError as e:
+        raise RuntimeError("NER_BACKEND=onnx requires `pip install optimum[onnxruntime]`") from e
+    if not os.path.isdir(NER_ONNX_DIR):
+        raise RuntimeError(f"No quantized NER model in {NER_ONNX_DIR}; run `python ner_backends.py export`")
+    model = ORTModelForTokenClassification.from_pretrained(NER_ONNX_DIR, file_name="model_quantized.onnx")
+    tokenizer = AutoTokenizer.from_pretrained(NER_ONNX_DIR)
+    # aggregation_strategy="simple" is what grouped_entities=True maps to in the PyTorch pipeline.
+    return pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
+
+
+BACKENDS = {"transformers": load_transformers, "onnx": load_onnx}
+
+
+def load_backend(name, model_name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown NER_BACKEND '{name}'; choose one of {', '.join(BACKENDS)}")
+    print(f"Loading {name} NER model '{model_name}'...")
+    return BACKENDS[name](model_name)
+
+
+def export_onnx(model_name, output_dir=NER_ONNX_DIR):
+    """
+    Exports the model to ONNX and writes a dynamically quantized (int8 weights) copy next to it.
+    """
+    from optimum.onnxruntime import ORTModelForTokenClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    model = ORTModelForTokenClassification.from_pretrained(model_name, export=True)
+    model.save_pretrained(output_dir)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(output_dir)
+    quantizer = ORTQuantizer.from_pretrained(output_dir)
+    quantizer.quantize(save_dir=output_dir,
+                       quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False))
+    print(f"Quantized NER model written to {output_dir}")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] != ["export"]:
+        sys.exit("Usage: python ner_backends.py export [model_name]")
+    export_onnx(sys.argv[2] if len(sys.argv) > 2 else os.environ.get('NER_MODEL', 'dslim/bert-base-NER'))
@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+
+from metrics import inc
+
+# How long the cached sales reps and products are trusted before they are reloaded from the database.
+REFERENCE_CACHE_TTL = float(os.environ.get('REFERENCE_CACHE_TTL', 300))
+
+
+class ReferenceCache:
+    """
+    Process-local copy of the sales_rep and product tables, used to resolve names to IDs
+    and to fuzzy-match rep names without a query per record.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = ({}, [], {}, [])  # rep ids by lower name, rep names, product ids by lower name, product names
+        self._loaded_at = 0.0
+
+    def is_stale(self):
+        return time.time() - self._loaded_at > REFERENCE_CACHE_TTL
+
+    def load(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT Sales_Rep_ID, Rep_Name FROM sales_rep")
+            reps = cursor.fetchall()
+            cursor.execute("SELECT Product_ID, Product_Name FROM product")
+            products = cursor.fetchall()
+        rep_ids, product_ids = {}, {}
+        for row in reps:
+            if row["Rep_Name"]: rep_ids.setdefault(row["Rep_Name"].lower(), row["Sales_Rep_ID"])
+        for row in products:
+            if row["Product_Name"]: product_ids.setdefault(row["Product_Name"].lower(), row["Product_ID"])
+        rep_names = list(dict.fromkeys(row["Rep_Name"] for row in reps if row["Rep_Name"]))
+        product_names = list(dict.fromkeys(row["Product_Name"] for row in products if row["Product_Name"]))
+        with self._lock:
+            self._state = (rep_ids, rep_names, product_ids, product_names)
+            self._loaded_at = time.time()
+
+    def ensure_loaded(self, connection):
+        if self.is_stale():
+            inc("crm_cache_requests_total", cache="reference", result="reload")
+            self.load(connection)
+        else:
+            inc("crm_cache_requests_total", cache="reference", result="hit")
+
+    def invalidate(self):
+        """
+        Forces a reload on next use, e.g. after a new sales rep has been inserted.
+        """
+        self._loaded_at = 0.0
+
+    def rep_id(self, rep_name):
+        return self._state[0].get((rep_name or "").lower())
+
+    def rep_names(self):
+        return self._state[1]
+
+    def product_id(self, product_name):
+        return self._state[2].get((product_name or "").lower())
+
+    def product_names(self):
+        return self._state[3]
+
+
+reference_cache = ReferenceCache()
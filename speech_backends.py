@@ -0,0 +1,63 @@
+"""
+Speech-to-text engines behind one interface: backend.transcribe(audio, **options) returns a
+Whisper-style {"text", "segments", "language"} dict for a file path or 16 kHz float32 samples.
+
+* "whisper" (default): openai-whisper in float32 PyTorch.
+* "faster-whisper": the same Whisper checkpoints on CTranslate2, int8-quantized on CPU by default.
+  Needs `pip install faster-whisper`.
+"""
+import os
+
+SPEECH_BACKEND = os.environ.get('SPEECH_BACKEND', 'whisper')
+SPEECH_COMPUTE_TYPE = os.environ.get('SPEECH_COMPUTE_TYPE', 'int8')
+SPEECH_THREADS = int(os.environ.get('SPEECH_THREADS', 0))  # 0 keeps the library default
+
+
+class WhisperBackend:
+    name = "whisper"
+
+    def __init__(self, model_size, threads=0, compute_type=None):
+        import whisper
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = whisper.load_model(model_size, device="cpu")
+
+    def transcribe(self, audio, **options):
+        options.setdefault("fp16", False)  # fp16 is unsupported on CPU; setting it avoids a warning per call
+        return self.model.transcribe(audio, **options)
+
+
+class FasterWhisperBackend:
+    name = "faster-whisper"
+
+    def __init__(self, model_size, threads=0, compute_type=SPEECH_COMPUTE_TYPE):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise RuntimeError("SPEECH_BACKEND=faster-whisper requires `pip install faster-whisper`") from e
+        self.model = WhisperModel(model_size, device="cpu", compute_type=compute_type, cpu_threads=threads)
+
+    def transcribe(self, audio, **options):
+        segments, info = self.model.transcribe(audio, **options)
+        segments = [{"id": index, "start": segment.start, "end": segment.end, "text": segment.text,
+                     "avg_logprob": segment.avg_logprob, "no_speech_prob": segment.no_speech_prob}
+                    for index, segment in enumerate(segments)]
+        return {"text": "".join(segment["text"] for segment in segments), "segments": segments,
+                "language": info.language}
+
+
+BACKENDS = {backend.name: backend for backend in (WhisperBackend, FasterWhisperBackend)}
+
+
+def load_backend(name, model_size, threads=None, compute_type=None):
+    """
+    Instantiates a backend by name. threads and compute_type default to the current module settings,
+    which worker processes may override before the first load.
+    """
+    threads = SPEECH_THREADS if threads is None else threads
+    compute_type = compute_type or SPEECH_COMPUTE_TYPE
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown SPEECH_BACKEND '{name}'; choose one of {', '.join(BACKENDS)}")
+    print(f"Loading {name} speech model '{model_size}'...")
+    return BACKENDS[name](model_size, threads=threads, compute_type=compute_type)
@@ -0,0 +1,127 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import models
+import speech_backends
+from audio import SAMPLE_RATE, preprocess_audio, source_time
+from metrics import timed, timer
+
+# Recordings are transcribed in TRANSCRIBE_WORKERS worker processes, each holding its own model (0 keeps
+# transcription in the web process, as do the shared model modes MODEL_SERVER_ADDRESS and PRELOAD_MODELS).
+# At most TRANSCRIBE_MAX_INFLIGHT recordings or chunks are queued or running at once; further submissions
+# wait for a slot instead of piling up behind one large upload.
+TRANSCRIBE_WORKERS = int(os.environ.get('TRANSCRIBE_WORKERS', os.environ.get('LONG_AUDIO_WORKERS', os.cpu_count() or 1)))
+TRANSCRIBE_MAX_INFLIGHT = int(os.environ.get('TRANSCRIBE_MAX_INFLIGHT', max(1, TRANSCRIBE_WORKERS)))
+# Recordings at least this long are split at silences into chunks of about LONG_AUDIO_CHUNK_SECONDS
+# (never longer than LONG_AUDIO_MAX_CHUNK_SECONDS) transcribed in parallel.
+LONG_AUDIO_THRESHOLD_SECONDS = float(os.environ.get('LONG_AUDIO_THRESHOLD_SECONDS', 600))
+LONG_AUDIO_CHUNK_SECONDS = float(os.environ.get('LONG_AUDIO_CHUNK_SECONDS', 60))
+LONG_AUDIO_MAX_CHUNK_SECONDS = float(os.environ.get('LONG_AUDIO_MAX_CHUNK_SECONDS', 90))
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(TRANSCRIBE_MAX_INFLIGHT)
+
+
+def _init_worker(threads):
+    speech_backends.SPEECH_THREADS = threads
+
+
+def get_pool():
+    """
+    Returns the shared process pool. Each worker loads its own copy of the speech model on first use
+    and gets an equal share of the CPU cores for intra-op threads.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                threads = max(1, (os.cpu_count() or 1) // TRANSCRIBE_WORKERS)
+                # spawn, not fork: the web process already runs threads that must not be copied mid-flight.
+                _pool = ProcessPoolExecutor(max_workers=TRANSCRIBE_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_worker, initargs=(threads,))
+    return _pool
+
+
+def plan_chunks(duration, silences, target=LONG_AUDIO_CHUNK_SECONDS, max_length=LONG_AUDIO_MAX_CHUNK_SECONDS):
+    """
+    Picks chunk boundaries at the middle of the silence closest to every target seconds, falling
+    back to a hard cut when no silence occurs within max_length. Returns (start, end) pairs in seconds.
+    """
+    midpoints = [(start + end) / 2 for start, end in silences]
+    boundaries = [0.0]
+    while duration - boundaries[-1] > max_length:
+        start = boundaries[-1]
+        window = [m for m in midpoints if start + target / 2 < m <= start + max_length]
+        boundaries.append(min(window, key=lambda m: abs(m - start - target)) if window else start + max_length)
+    boundaries.append(duration)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def _transcribe_samples(samples, options):
+    return models.transcribe_local(samples, **options)
+
+
+def submit_samples(samples, options):
+    """
+    Queues samples on the worker pool and returns the future, blocking while TRANSCRIBE_MAX_INFLIGHT
+    submissions are still pending.
+    """
+    _slots.acquire()
+    try:
+        future = get_pool().submit(_transcribe_samples, samples, options)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+def stitch_results(results, chunks):
+    """
+    Joins chunk results in order into one Whisper-style result, shifting segment times by each
+    chunk's start so they refer to the original recording.
+    """
+    segments = []
+    for result, (offset, _) in zip(results, chunks):
+        for segment in result.get("segments", []):
+            segments.append(dict(segment, id=len(segments), start=segment["start"] + offset,
+                                 end=segment["end"] + offset))
+    return {"text": "".join(result["text"] for result in results), "segments": segments,
+            "language": results[0].get("language") if results else None}
+
+
+def restore_timestamps(result, spans):
+    """
+    Maps segment times of a result for trimmed audio back onto the original recording.
+    """
+    result["segments"] = [dict(segment, start=source_time(spans, segment["start"]),
+                               end=source_time(spans, segment["end"])) for segment in result.get("segments", [])]
+    return result
+
+
+@timed("crm_stage_seconds", stage="transcribe")
+def transcribe_file(filepath, **options):
+    """
+    Drop-in replacement for whisper_model.transcribe(filepath) on any speech backend: decodes once to
+    silence-trimmed samples in memory and transcribes them on the worker pool; long recordings are
+    split into silence-aligned chunks transcribed in parallel and stitched back together.
+    Segment times refer to the original recording. Safe to call from several threads at once.
+    """
+    with timer("crm_stage_seconds", stage="preprocess_audio"):
+        samples, silences, spans = preprocess_audio(filepath)
+    duration = len(samples) / SAMPLE_RATE
+    # A shared model server serializes requests anyway, so worker processes would only add overhead there;
+    # with preloaded models each spawned worker would load its own copy of both models next to the shared one.
+    if models.MODEL_SERVER_ADDRESS or models.PRELOAD_MODELS or TRANSCRIBE_WORKERS < 1:
+        return restore_timestamps(models.transcribe(samples, **options), spans)
+    if duration < LONG_AUDIO_THRESHOLD_SECONDS:
+        return restore_timestamps(submit_samples(samples, options).result(), spans)
+    chunks = plan_chunks(duration, silences)
+    print(f"Transcribing {os.path.basename(filepath)} ({duration:.0f}s after trimming) in {len(chunks)} chunks")
+    futures = [submit_samples(samples[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)], options)
+               for start, end in chunks]
+    return restore_timestamps(stitch_results([future.result() for future in futures], chunks), spans)
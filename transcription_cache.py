@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from metrics import inc
+
+# On-disk cache of transcripts and extracted fields, keyed by audio content and model settings.
+CACHE_DIR = os.environ.get('TRANSCRIPTION_CACHE_DIR', os.path.join('cache', 'transcriptions'))
+CACHE_MAX_BYTES = int(os.environ.get('TRANSCRIPTION_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+CACHE_MAX_AGE_SECONDS = int(os.environ.get('TRANSCRIPTION_CACHE_MAX_AGE', 30 * 24 * 3600))
+
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_lock = threading.Lock()
+
+
+def cache_key(filepath, settings):
+    """
+    Builds the cache key from a SHA-256 of the audio bytes plus the model name and settings,
+    so changing the model or its options never serves a stale transcript.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _entry_path(key):
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def get_cached(key):
+    """
+    Returns the cached {"transcription", "fields"} entry for the key, or None on a miss.
+    Entries older than CACHE_MAX_AGE_SECONDS are treated as misses and removed.
+    """
+    path = _entry_path(key)
+    try:
+        if time.time() - os.path.getmtime(path) > CACHE_MAX_AGE_SECONDS:
+            os.remove(path)
+            raise FileNotFoundError(path)
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        os.utime(path)  # Refresh mtime so eviction drops least recently used entries first.
+    except (OSError, ValueError):
+        with _lock:
+            _stats["misses"] += 1
+        inc("crm_cache_requests_total", cache="transcription", result="miss")
+        return None
+    with _lock:
+        _stats["hits"] += 1
+    inc("crm_cache_requests_total", cache="transcription", result="hit")
+    return entry
+
+
+def put_cached(key, transcription, fields):
+    """
+    Stores a transcript and its extracted fields, then evicts old entries if the cache is over budget.
+    """
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{_entry_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"transcription": transcription, "fields": fields, "cached_at": time.time()}, f)
+        os.replace(tmp_path, _entry_path(key))
+        _evict()
+    except OSError as e:
+        print(f"Failed to write transcription cache entry: {e}")
+
+
+def _list_entries():
+    entries = []
+    for entry in os.scandir(CACHE_DIR):
+        if entry.name.endswith(".json"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    return entries
+
+
+def _evict():
+    """
+    Removes expired entries, then the least recently used ones until the cache fits in CACHE_MAX_BYTES.
+    """
+    entries = sorted(_list_entries())
+    cutoff = time.time() - CACHE_MAX_AGE_SECONDS
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for mtime, size, path in entries:
+        if mtime >= cutoff and total <= CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        evicted += 1
+    if evicted:
+        with _lock:
+            _stats["evictions"] += evicted
+
+
+def cache_stats():
+    """
+    Returns hit/miss/eviction counters for this process plus the current size of the cache.
+    """
+    with _lock:
+        stats = dict(_stats)
+    entries = _list_entries() if os.path.isdir(CACHE_DIR) else []
+    stats["entries"] = len(entries)
+    stats["bytes"] = sum(size for _, size, _ in entries)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats